@@ -0,0 +1,225 @@
+"""
+Admission control for expensive endpoints.
+
+Each route group has a concurrency limit and a bounded wait queue. A request
+that finds the group saturated waits in the queue up to the group's deadline;
+if the queue is full or the deadline passes it is turned away immediately
+with ``503 Service Unavailable`` and a ``Retry-After`` estimate, so a burst on
+one expensive route cannot starve the cheap ones.
+
+Limits are configured per group with ``MAHJONGG_ADMISSION_<GROUP>`` set to
+``limit,queue,timeout_seconds``, e.g. ``MAHJONGG_ADMISSION_ANALYZE=16,32,0.25``.
+Queue depth, admissions and rejections are exported in Prometheus text format
+by ``render_metrics``.
+"""
+import asyncio
+import json
+import math
+import os
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Pattern, Tuple
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted."""
+    def __init__(self, reason: str, retry_after: int):
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(reason)
+
+
+class AdmissionLimiter:
+    """Concurrency limit with a bounded, deadline-aware FIFO wait queue."""
+
+    def __init__(self, name: str, limit: int, queue_size: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Exponentially weighted average service time, for Retry-After
+        self._service_time = 0.05
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "deadline": 0}
+        self.queue_wait_total = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up, at least 1."""
+        backlog = self.active + len(self._waiters)
+        return max(1, math.ceil(backlog * self._service_time / max(1, self.limit)))
+
+    def _reject(self, reason: str):
+        self.rejected[reason] += 1
+        raise Rejected(reason, self.retry_after())
+
+    async def acquire(self):
+        """Take a slot, waiting in the queue if needed. Raises ``Rejected``."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the deadline passed
+                self.queue_wait_total += time.monotonic() - started
+                self.admitted += 1
+                return
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            self._reject("deadline")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+        self.queue_wait_total += time.monotonic() - started
+        self.admitted += 1
+
+    def release(self, service_time: Optional[float] = None):
+        """Give a slot back, handing it straight to the next waiter if any."""
+        if service_time is not None:
+            self._service_time = 0.9 * self._service_time + 0.1 * service_time
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot passes to the waiter; ``active`` stays the same
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+def _config_from_env(group: str, limit: int, queue_size: int, timeout: float) -> Tuple[int, int, float]:
+    value = os.environ.get(f"MAHJONGG_ADMISSION_{group.upper()}")
+    if not value:
+        return limit, queue_size, timeout
+    parts = value.split(",")
+    return int(parts[0]), int(parts[1]), float(parts[2])
+
+
+# Route groups: (name, method, path pattern, default limit, queue size, timeout)
+DEFAULT_GROUPS = [
+    ("variations", "GET", r"^/templates/[^/]+/variations$", 4, 8, 1.0),
+    ("analyze", "POST", r"^/analyze(/|$)", 32, 64, 0.5),
+    ("search", "POST", r"^/(search|live-variations|waits)$", 16, 32, 0.5),
+    ("deals", "GET", r"^/deals$", 2, 2, 0.5),
+]
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying admission limits per route group.
+
+    A slot is held until the response has been fully sent, so streamed
+    responses count against their group for their whole duration.
+    """
+
+    def __init__(self, app, groups=None):
+        self.app = app
+        self.rules: List[Tuple[str, Pattern, AdmissionLimiter]] = []
+        for name, method, pattern, limit, queue_size, timeout in groups or DEFAULT_GROUPS:
+            limit, queue_size, timeout = _config_from_env(name, limit, queue_size, timeout)
+            self.rules.append((method, re.compile(pattern), AdmissionLimiter(name, limit, queue_size, timeout)))
+        register_limiters([limiter for _, _, limiter in self.rules])
+
+    def _limiter_for(self, scope) -> Optional[AdmissionLimiter]:
+        for method, pattern, limiter in self.rules:
+            if scope["method"] == method and pattern.search(scope["path"]):
+                return limiter
+        return None
+
+    async def __call__(self, scope, receive, send):
+        limiter = self._limiter_for(scope) if scope["type"] == "http" else None
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire()
+        except Rejected as e:
+            await _send_overloaded(send, e)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.monotonic() - started)
+
+
+async def _send_overloaded(send, rejection: Rejected):
+    body = json.dumps({"detail": "Server busy, retry later", "reason": rejection.reason}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(rejection.retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+_limiters: List[AdmissionLimiter] = []
+
+
+def register_limiters(limiters: List[AdmissionLimiter]):
+    """Make limiters visible to ``render_metrics``."""
+    _limiters[:] = limiters
+
+
+def render_metrics() -> str:
+    """Admission metrics in Prometheus text exposition format."""
+    lines = [
+        "# HELP mahjongg_admission_active Requests currently being served",
+        "# TYPE mahjongg_admission_active gauge",
+    ]
+    lines += [f'mahjongg_admission_active{{group="{l.name}"}} {l.active}' for l in _limiters]
+    lines += [
+        "# HELP mahjongg_admission_queue_depth Requests waiting for a slot",
+        "# TYPE mahjongg_admission_queue_depth gauge",
+    ]
+    lines += [f'mahjongg_admission_queue_depth{{group="{l.name}"}} {l.queued}' for l in _limiters]
+    lines += [
+        "# HELP mahjongg_admission_limit Concurrency limit",
+        "# TYPE mahjongg_admission_limit gauge",
+    ]
+    lines += [f'mahjongg_admission_limit{{group="{l.name}"}} {l.limit}' for l in _limiters]
+    lines += [
+        "# HELP mahjongg_admission_admitted_total Requests admitted",
+        "# TYPE mahjongg_admission_admitted_total counter",
+    ]
+    lines += [f'mahjongg_admission_admitted_total{{group="{l.name}"}} {l.admitted}' for l in _limiters]
+    lines += [
+        "# HELP mahjongg_admission_rejected_total Requests turned away with 503",
+        "# TYPE mahjongg_admission_rejected_total counter",
+    ]
+    lines += [
+        f'mahjongg_admission_rejected_total{{group="{l.name}",reason="{reason}"}} {count}'
+        for l in _limiters for reason, count in l.rejected.items()
+    ]
+    lines += [
+        "# HELP mahjongg_admission_queue_wait_seconds_total Time admitted requests spent queued",
+        "# TYPE mahjongg_admission_queue_wait_seconds_total counter",
+    ]
+    lines += [
+        f'mahjongg_admission_queue_wait_seconds_total{{group="{l.name}"}} {l.queue_wait_total:.6f}'
+        for l in _limiters
+    ]
+    return "\n".join(lines) + "\n"
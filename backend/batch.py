@@ -0,0 +1,182 @@
+"""
+Command-line batch analyzer.
+
+Reads hands from files or stdin and analyzes each against one or all
+templates, sharded across a process pool, without going through the web
+server. Results are written as JSON lines to stdout and a throughput summary
+to stderr.
+
+Input lines are either JSON (a list of short names, a list of
+``{"short_name": ...}`` objects, or an object with ``tiles`` or ``hand`` and
+an optional ``id``) or plain short names separated by spaces or commas.
+
+Usage (from the backend directory):
+
+    python -m batch hands.jsonl
+    cat hands.txt | python -m batch --template sequence_and_kongs --workers 8 --unordered
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from functools import partial
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from core.result_cache import analyze_cached, get_analysis_cache
+from core.tiles import ids_to_counts, parse_short_names
+from core.variation_table import get_variation_table
+
+DEFAULT_CHUNK_SIZE = 256
+
+# (line number, raw line)
+Line = Tuple[int, str]
+
+
+def bounded_map(executor: Optional[Executor], fn: Callable, items: Iterable,
+                window: int, ordered: bool = True) -> Iterator[Any]:
+    """
+    Map ``fn`` over ``items`` with at most ``window`` tasks in flight.
+
+    Unlike ``Executor.map`` this never reads further ahead than the window,
+    so memory stays bounded however long the input is.
+    """
+    if executor is None:
+        for item in items:
+            yield fn(item)
+        return
+
+    items = iter(items)
+    pending = deque(executor.submit(fn, item) for item in islice(items, window))
+    while pending:
+        if ordered:
+            done = [pending.popleft()]
+        else:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            done = [future for future in pending if future in finished]
+            for future in done:
+                pending.remove(future)
+        for future in done:
+            yield future.result()
+            for item in islice(items, 1):
+                pending.append(executor.submit(fn, item))
+
+
+def parse_hand_line(text: str) -> Tuple[Optional[Any], List[str]]:
+    """Parse an input line into (hand id, short names)."""
+    text = text.strip()
+    if text[:1] in "[{":
+        data = json.loads(text)
+        hand_id = None
+        if isinstance(data, dict):
+            hand_id = data.get("id")
+            data = data.get("tiles", data.get("hand", []))
+        return hand_id, [t["short_name"] if isinstance(t, dict) else t for t in data]
+    return None, text.replace(",", " ").split()
+
+
+def analyze_line(line: Line, template_ids: List[str]) -> dict:
+    """Analyze one input line against the given templates."""
+    line_no, text = line
+    try:
+        hand_id, short_names = parse_hand_line(text)
+        counts = ids_to_counts(parse_short_names(short_names))
+    except (ValueError, KeyError, TypeError) as e:
+        return {"line": line_no, "error": str(e)}
+
+    table = get_variation_table()
+    cache = get_analysis_cache()
+    results = {}
+    best = None
+    for template_id in template_ids:
+        analysis = analyze_cached(table, template_id, counts, cache)
+        results[template_id] = {
+            "distance": analysis.distance,
+            "is_match": analysis.is_match,
+            "variation": analysis.variation,
+            "jokers": analysis.jokers,
+        }
+        if best is None or analysis.distance < results[best]["distance"]:
+            best = template_id
+
+    record = {"line": line_no, "best": best, "results": results}
+    if hand_id is not None:
+        record["id"] = hand_id
+    return record
+
+
+def analyze_chunk(chunk: List[Line], template_ids: List[str]) -> List[dict]:
+    """Analyze a chunk of input lines (runs in a worker process)."""
+    return [analyze_line(line, template_ids) for line in chunk]
+
+
+def _chunks(lines: Iterable[Line], size: int) -> Iterator[List[Line]]:
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _read_lines(paths: List[str]) -> Iterator[Line]:
+    line_no = 0
+    for path in paths or ["-"]:
+        stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+        try:
+            for text in stream:
+                line_no += 1
+                if text.strip() and not text.lstrip().startswith("#"):
+                    yield line_no, text
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Analyze hands in bulk against hand templates")
+    parser.add_argument("inputs", nargs="*", help="Input files (default or '-': stdin)")
+    parser.add_argument("--template", action="append", dest="templates",
+                        help="Template id to analyze against (repeatable; default: all)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (1 analyzes in this process)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Hands per task sent to a worker")
+    parser.add_argument("--unordered", action="store_true",
+                        help="Write results as they finish instead of in input order")
+    args = parser.parse_args(argv)
+
+    table = get_variation_table()
+    template_ids = args.templates or table.template_ids
+    unknown = [t for t in template_ids if t not in table]
+    if unknown:
+        parser.error(f"Unknown template(s): {', '.join(unknown)}")
+
+    started = time.perf_counter()
+    hands = errors = 0
+    executor = ProcessPoolExecutor(args.workers) if args.workers > 1 else None
+    try:
+        chunks = _chunks(_read_lines(args.inputs), args.chunk_size)
+        work = partial(analyze_chunk, template_ids=template_ids)
+        out = sys.stdout
+        for records in bounded_map(executor, work, chunks, window=2 * args.workers,
+                                   ordered=not args.unordered):
+            for record in records:
+                hands += 1
+                errors += "error" in record
+                out.write(json.dumps(record, separators=(",", ":")) + "\n")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    elapsed = time.perf_counter() - started
+    rate = hands / elapsed if elapsed else 0.0
+    print(f"Analyzed {hands} hands ({errors} errors) against {len(template_ids)} templates "
+          f"in {elapsed:.2f}s: {rate:.0f} hands/s with {args.workers} worker(s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Hand analysis over compiled variation tables.
+
+Jokers may stand in for tiles of pungs, kongs and larger groups of identical
+tiles but never for singles, pairs or runs. Each compiled variation records
+both how many of each tile it needs and how many of those must be natural, so
+a hand is matched by comparing per-tile deficits: natural deficits always
+count as missing tiles, group deficits are covered from the hand's joker
+budget first.
+
+Deficits are computed on count vectors packed into integers, one byte lane per
+tile kind, so each variation costs a fixed handful of integer operations
+rather than a Python loop over every tile kind.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from .tiles import JOKER_ID, NUM_TILE_KINDS, TILE_KINDS
+from .variation_table import VariationTable, record_short_names
+
+HAND_SIZE = 14
+
+
+@dataclass
+class HandAnalysis:
+    """Closest variation of a template to a hand."""
+    template_id: str
+    distance: int                   # Tiles still missing from the closest variation
+    variation_index: Optional[int]  # Index of the closest variation, if any
+    variation: List[str]            # Short names of the closest variation's tiles
+    jokers: Dict[str, int] = field(default_factory=dict)  # Tiles the hand's jokers stand in for
+
+    @property
+    def is_match(self) -> bool:
+        return self.distance == 0
+
+
+# High bit of every byte lane
+_LANE_HIGH_BITS = int.from_bytes(b"\x80" * NUM_TILE_KINDS, "little")
+
+
+def pack_counts(counts) -> int:
+    """Pack a count vector (every count below 128) into one integer, a byte per kind."""
+    return int.from_bytes(bytes(counts), "little")
+
+
+def packed_deficit(required: int, have: int) -> int:
+    """Sum over kinds of max(0, required - have) for two packed count vectors."""
+    # Setting each lane's high bit first keeps borrows inside their lane; the
+    # high bit survives exactly in the lanes where required >= have
+    difference = (required | _LANE_HIGH_BITS) - have
+    keep = ((difference & _LANE_HIGH_BITS) >> 7) * 0xFF
+    # The lanes sum to less than 255, so the sum is the value mod 255
+    return ((difference ^ _LANE_HIGH_BITS) & keep) % 255
+
+
+def packed_distance(need: int, natural: int, have: int, jokers: int) -> int:
+    """Tiles a packed hand is missing from one packed variation, after using its jokers."""
+    natural_missing = packed_deficit(natural, have)
+    group_missing = packed_deficit(need, have) - natural_missing
+    return natural_missing + max(0, group_missing - jokers)
+
+
+def joker_assignment(need, natural, counts: List[int]) -> Dict[str, int]:
+    """Which group tiles a hand's jokers stand in for, by short name."""
+    remaining = counts[JOKER_ID]
+    assignment = {}
+    for kind, (required, required_natural, have) in enumerate(zip(need, natural, counts)):
+        if remaining == 0:
+            break
+        group_missing = required - max(have, required_natural)
+        if group_missing > 0:
+            used = min(group_missing, remaining)
+            assignment[TILE_KINDS[kind]] = used
+            remaining -= used
+    return assignment
+
+
+def analyze_counts(table: VariationTable, template_id: str, counts: List[int],
+                   variations: Optional[Iterable[int]] = None) -> HandAnalysis:
+    """
+    Find the variation of a template closest to a hand.
+
+    Args:
+        table: Compiled variation table containing the template
+        template_id: ID of the template to analyze against
+        counts: The hand as a count vector over compact tile ids
+        variations: Only consider these variation indices (e.g. the live ones)
+    """
+    packed = table.packed_records(template_id)
+    if variations is None:
+        variations = range(len(packed))
+
+    jokers = counts[JOKER_ID]
+    have = pack_counts(counts)
+    best_distance = HAND_SIZE + 1
+    best_index = None
+    for index in variations:
+        need, natural = packed[index]
+        distance = packed_distance(need, natural, have, jokers)
+        if distance < best_distance:
+            best_distance, best_index = distance, index
+            if distance == 0:
+                break
+
+    return build_analysis(table, template_id, counts, best_distance, best_index)
+
+
+def build_analysis(table: VariationTable, template_id: str, counts: List[int],
+                   best_distance: int, best_index: Optional[int]) -> HandAnalysis:
+    """Describe the closest variation found for a hand."""
+    if best_index is None:
+        return HandAnalysis(template_id=template_id, distance=HAND_SIZE,
+                            variation_index=None, variation=[])
+
+    # A hand with extra tiles is not complete, even if it covers a variation
+    extra = max(0, sum(counts) - HAND_SIZE)
+    need, natural = table.record(template_id, best_index)
+    return HandAnalysis(
+        template_id=template_id,
+        distance=best_distance + extra,
+        variation_index=best_index,
+        variation=record_short_names(need),
+        jokers=joker_assignment(need, natural, counts),
+    )
@@ -0,0 +1,119 @@
+"""
+JSON catalog of templates and variations.
+
+All JSON bodies are encoded once per registry version and reused. Variations
+are sent as compact strings of their tile sets, e.g.
+
+    "2x1B 3x3B 4x5C 3x7D 2x9D"
+
+where ``NxT`` is N copies of tile T, and sets of different tiles (chows and
+sequences) join their short names with ``+`` ("1B+2B+3B").
+
+orjson is used for encoding when it is installed, the standard library
+otherwise.
+"""
+import hashlib
+import json
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from .hand_templates import HandTemplate, list_templates
+from .tilesets import TileSet
+
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_tile_set(tile_set: TileSet) -> str:
+    """Encode a tile set as ``NxT`` or ``T1+T2+...``."""
+    names = [tile.short_name for tile in tile_set.tiles]
+    if all(name == names[0] for name in names):
+        return f"{len(names)}x{names[0]}"
+    return "+".join(names)
+
+
+def encode_variation(variation: List[TileSet]) -> str:
+    """Encode a variation as a space-separated string of its tile sets."""
+    return " ".join(encode_tile_set(tile_set) for tile_set in variation)
+
+
+def template_summary(template: HandTemplate, variation_count: int) -> dict:
+    return {
+        "template_id": template.template_id,
+        "name": template.name,
+        "description": template.description,
+        "category": template.category,
+        "number": template.number,
+        "point_value": template.point_value,
+        "variation_count": variation_count,
+    }
+
+
+class CardCatalog:
+    """Pre-encoded JSON for a set of templates."""
+
+    def __init__(self, templates: List[HandTemplate]):
+        self._variations: Dict[str, List[bytes]] = {}
+        self._summaries: Dict[str, dict] = {}
+        digest = hashlib.sha1()
+        for template in templates:
+            encoded = [encode_variation(v) for v in template.generate_variations()]
+            # Each variation is stored as its JSON string literal, ready to join
+            self._variations[template.template_id] = [dumps(v) for v in encoded]
+            self._summaries[template.template_id] = template_summary(template, len(encoded))
+            digest.update(dumps(self._summaries[template.template_id]))
+            digest.update("\n".join(encoded).encode("utf-8"))
+
+        # Changes whenever any template or variation does
+        self.version = digest.hexdigest()[:12]
+        self.templates_body = dumps({
+            "version": self.version,
+            "templates": list(self._summaries.values()),
+        })
+        self._template_bodies = {
+            template_id: dumps({"version": self.version, **summary})
+            for template_id, summary in self._summaries.items()
+        }
+        self.variations_page = lru_cache(maxsize=1024)(self._variations_page)
+
+    def __contains__(self, template_id: str) -> bool:
+        return template_id in self._summaries
+
+    def template_body(self, template_id: str) -> bytes:
+        return self._template_bodies[template_id]
+
+    def _variations_page(self, template_id: str, offset: int, limit: int) -> bytes:
+        """JSON body of one page of a template's variations."""
+        variations = self._variations[template_id]
+        page = variations[offset:offset + limit]
+        header = dumps({
+            "template_id": template_id,
+            "version": self.version,
+            "total": len(variations),
+            "offset": offset,
+            "limit": limit,
+        })
+        # Splice the pre-encoded variation strings into the object
+        return header[:-1] + b',"variations":[' + b",".join(page) + b"]}"
+
+
+_catalog: Optional[CardCatalog] = None
+
+
+def get_catalog() -> CardCatalog:
+    """Get the catalog of the registered templates."""
+    global _catalog
+    if _catalog is None:
+        _catalog = CardCatalog(list_templates())
+    return _catalog
@@ -0,0 +1,94 @@
+"""
+Seeded server-side dealer over the 152-tile set.
+
+A deal is fully determined by its seed: the wall is built in tile id order,
+shuffled with ``random.Random(seed)`` (a Mersenne Twister whose integer
+seeding and ``shuffle`` are stable across Python releases) and dealt from the
+end of an array, so every draw is O(1). The same seed always reproduces the
+same wall, hands and draw order.
+"""
+import random
+from array import array
+from dataclasses import dataclass
+from typing import Iterator, List
+
+from .tiles import TILE_COPIES, TILE_KINDS
+
+# The full set as compact tile ids, in id order
+FULL_SET = array('B', [kind for kind, copies in enumerate(TILE_COPIES) for _ in range(copies)])
+
+DEFAULT_PLAYERS = 4
+DEFAULT_HAND_SIZE = 13
+
+
+class Wall:
+    """A shuffled wall of compact tile ids."""
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.tiles = array('B', FULL_SET)
+        random.Random(seed).shuffle(self.tiles)
+        self._next = len(self.tiles)
+
+    def __len__(self) -> int:
+        return self._next
+
+    def draw(self) -> int:
+        """Draw the next tile id from the wall."""
+        if self._next == 0:
+            raise IndexError("The wall is empty")
+        self._next -= 1
+        return self.tiles[self._next]
+
+    def draw_many(self, count: int) -> List[int]:
+        """Draw several tiles at once."""
+        if count > self._next:
+            raise IndexError(f"Cannot draw {count} tiles from a wall of {self._next}")
+        start = self._next - count
+        drawn = self.tiles[start:self._next].tolist()
+        drawn.reverse()
+        self._next = start
+        return drawn
+
+
+@dataclass
+class Deal:
+    """Opening hands dealt from one seeded wall."""
+    seed: int
+    hands: List[List[int]]  # Sorted tile ids per seat; seat 0 is East
+    wall_remaining: int
+
+    def short_names(self) -> List[List[str]]:
+        return [[TILE_KINDS[kind] for kind in hand] for hand in self.hands]
+
+    def to_dict(self) -> dict:
+        return {
+            "seed": self.seed,
+            "hands": self.short_names(),
+            "wall_remaining": self.wall_remaining,
+        }
+
+
+def deal(seed: int, players: int = DEFAULT_PLAYERS, hand_size: int = DEFAULT_HAND_SIZE,
+         east_extra: bool = True) -> Deal:
+    """
+    Deal opening hands from the wall for a seed.
+
+    Args:
+        seed: Seed of the wall
+        players: Number of seats to deal
+        hand_size: Tiles per seat
+        east_extra: Whether East (seat 0) receives one extra tile
+    """
+    wall = Wall(seed)
+    hands = []
+    for seat in range(players):
+        size = hand_size + (1 if east_extra and seat == 0 else 0)
+        hands.append(sorted(wall.draw_many(size)))
+    return Deal(seed=seed, hands=hands, wall_remaining=len(wall))
+
+
+def iter_deals(seed_start: int, count: int, **kwargs) -> Iterator[Deal]:
+    """Deal one hand set per seed in ``[seed_start, seed_start + count)``."""
+    for seed in range(seed_start, seed_start + count):
+        yield deal(seed, **kwargs)
@@ -0,0 +1,121 @@
+"""
+Exact hand-difficulty counts.
+
+For every variation, counts how many of the C(152, n) possible n-tile deals
+start exactly d tiles away from it, by a counting dynamic program over the
+tile kinds rather than by sampling. Deals are sets of physical tiles, so a
+deal holding c of a kind's copies is counted C(copies, c) times.
+
+Only the kinds a variation needs affect its distance. The program walks
+those kinds tracking (tiles dealt so far, natural deficit, group deficit);
+the jokers and a single pooled "other" kind standing for every remaining tile
+are folded in at the end, where the jokers cover the group deficit. All
+arithmetic is on Python integers, so the counts are exact.
+
+Variations with the same per-kind (need, natural, copies) multiset, e.g. the
+suit relabellings of a hand, have identical counts and are computed once.
+Results are cached on the table, per hand size.
+"""
+from dataclasses import dataclass
+from math import comb
+from typing import Dict, List, Optional, Tuple
+
+from .analyzer import HAND_SIZE
+from .tiles import JOKER_ID, TILE_COPIES
+from .variation_table import VariationTable
+
+TOTAL_TILES = sum(TILE_COPIES)
+
+# Sorted (need, natural, copies) of each needed kind
+Signature = Tuple[Tuple[int, int, int], ...]
+
+
+@dataclass
+class VariationDifficulty:
+    """Distance distribution of the deals for one variation."""
+    template_id: str
+    variation_index: int
+    hand_size: int
+    distance_counts: List[int]  # Deals exactly d tiles away, d = 0..HAND_SIZE
+
+    @property
+    def total(self) -> int:
+        return comb(TOTAL_TILES, self.hand_size)
+
+    def within(self, k: int) -> int:
+        """Number of deals at most k tiles away."""
+        return sum(self.distance_counts[:k + 1])
+
+    def probability_within(self, k: int) -> float:
+        return self.within(k) / self.total
+
+
+def variation_signature(need, natural) -> Signature:
+    """The variation's requirements with the kind labels dropped."""
+    return tuple(sorted(
+        (required, natural[kind], TILE_COPIES[kind])
+        for kind, required in enumerate(need) if required and kind != JOKER_ID
+    ))
+
+
+def count_deals(signature: Signature, hand_size: int) -> List[int]:
+    """Number of ``hand_size``-tile deals at each distance from a variation."""
+    # (tiles dealt, natural deficit, group deficit) -> number of ways
+    states: Dict[Tuple[int, int, int], int] = {(0, 0, 0): 1}
+    pool = TOTAL_TILES - TILE_COPIES[JOKER_ID]
+    for required, required_natural, copies in signature:
+        pool -= copies
+        ways = [comb(copies, c) for c in range(copies + 1)]
+        next_states: Dict[Tuple[int, int, int], int] = {}
+        for (dealt, natural_missing, group_missing), count in states.items():
+            for c in range(min(copies, hand_size - dealt) + 1):
+                missing_natural = max(0, required_natural - c)
+                missing = max(0, required - c)
+                key = (dealt + c, natural_missing + missing_natural,
+                       group_missing + missing - missing_natural)
+                next_states[key] = next_states.get(key, 0) + count * ways[c]
+        states = next_states
+
+    jokers = TILE_COPIES[JOKER_ID]
+    distances = [0] * (HAND_SIZE + 1)
+    for (dealt, natural_missing, group_missing), count in states.items():
+        for j in range(min(jokers, hand_size - dealt) + 1):
+            rest = hand_size - dealt - j
+            if rest > pool:
+                continue
+            distance = natural_missing + max(0, group_missing - j)
+            distances[min(distance, HAND_SIZE)] += count * comb(jokers, j) * comb(pool, rest)
+    return distances
+
+
+class DifficultyTable:
+    """Deal-distance distributions for every variation of a table."""
+
+    def __init__(self, table: VariationTable, hand_size: int):
+        if not 0 < hand_size <= HAND_SIZE:
+            raise ValueError(f"Hand size must be between 1 and {HAND_SIZE}")
+        self.table = table
+        self.hand_size = hand_size
+        self.signatures_computed = 0
+        by_signature: Dict[Signature, List[int]] = {}
+        self.variations: Dict[str, List[VariationDifficulty]] = {}
+        for template_id in table.template_ids:
+            results = []
+            for index, (need, natural) in enumerate(table.records(template_id)):
+                signature = variation_signature(need, natural)
+                counts = by_signature.get(signature)
+                if counts is None:
+                    counts = by_signature[signature] = count_deals(signature, hand_size)
+                results.append(VariationDifficulty(template_id, index, hand_size, counts))
+            self.variations[template_id] = results
+        self.signatures_computed = len(by_signature)
+
+    def easiest(self, template_id: str, k: int) -> Optional[VariationDifficulty]:
+        """The template's variation with the most deals within k tiles."""
+        return max(self.variations[template_id], key=lambda v: v.within(k), default=None)
+
+
+def get_difficulty_table(table: VariationTable, hand_size: int) -> DifficultyTable:
+    """Get the difficulty counts of a table, computed once per hand size and cached on the table."""
+    return table.shared_lookup(f"difficulty_{hand_size}",
+                               lambda table: DifficultyTable(table, hand_size))
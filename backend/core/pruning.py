@@ -0,0 +1,137 @@
+"""
+Dead-hand pruning from visible tiles.
+
+Once tiles are discarded or exposed, the wall can no longer supply them. A
+variation is dead when it needs more natural tiles (singles, pairs, runs) of a
+kind than remain unseen, or when the tiles it needs beyond what remains
+exceed the jokers that remain unseen.
+
+``LiveVariations`` keeps that verdict for every variation of every template
+and updates it incrementally as each tile becomes visible, touching only the
+variations that depend on that tile through a per-tile dependency index.
+``live_indices`` gives the same verdict for one template without keeping any
+per-variation state, for callers that hold many small visible-tile vectors.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .analyzer import pack_counts, packed_deficit
+from .tiles import JOKER_ID, NUM_TILE_KINDS, TILE_COPIES
+from .variation_table import VariationTable
+
+# (template id, variation index)
+Slot = Tuple[str, int]
+
+
+class TileDependencyIndex:
+    """For every tile id, the variations that need it and how many."""
+
+    def __init__(self, table: VariationTable):
+        self.table = table
+        self.slots: List[Slot] = []
+        self.template_slots: Dict[str, range] = {}
+        # tile id -> [(slot, need, natural), ...]
+        self.by_tile: List[List[Tuple[int, int, int]]] = [[] for _ in range(NUM_TILE_KINDS)]
+
+        for template_id in table.template_ids:
+            first = len(self.slots)
+            for index, (need, natural) in enumerate(table.records(template_id)):
+                slot = len(self.slots)
+                self.slots.append((template_id, index))
+                for kind, required in enumerate(need):
+                    if required:
+                        self.by_tile[kind].append((slot, required, natural[kind]))
+            self.template_slots[template_id] = range(first, len(self.slots))
+
+
+def get_dependency_index(table: VariationTable) -> TileDependencyIndex:
+    """Get the dependency index of a table, built once and cached on the table."""
+    return table.shared_lookup("dependency_index", TileDependencyIndex)
+
+
+def _contribution(required: int, required_natural: int, available: int) -> Tuple[int, int]:
+    """(blocked, shortfall) of one tile kind for one variation."""
+    if required_natural > available:
+        return 1, 0
+    return 0, max(0, required - available)
+
+
+class LiveVariations:
+    """The variations still achievable given the tiles seen so far."""
+
+    def __init__(self, table: VariationTable, visible: Optional[List[int]] = None):
+        self.index = get_dependency_index(table)
+        self.available = list(TILE_COPIES)
+        slot_count = len(self.index.slots)
+        # Tile kinds whose natural requirement can no longer be met
+        self._blocked = [0] * slot_count
+        # Tiles the wall can no longer supply, which only jokers could cover
+        self._shortfall = [0] * slot_count
+        if visible is not None:
+            for kind, count in enumerate(visible):
+                if count:
+                    self.see(kind, count)
+
+    def see(self, kind: int, count: int = 1):
+        """Record that ``count`` more tiles of a kind became visible."""
+        available = self.available[kind]
+        if count > available:
+            raise ValueError(f"Only {available} tiles of kind {kind} remain unseen")
+        self.available[kind] = available - count
+        if kind == JOKER_ID:
+            return
+
+        blocked = self._blocked
+        shortfall = self._shortfall
+        for slot, required, required_natural in self.index.by_tile[kind]:
+            old_blocked, old_short = _contribution(required, required_natural, available)
+            new_blocked, new_short = _contribution(required, required_natural, available - count)
+            blocked[slot] += new_blocked - old_blocked
+            shortfall[slot] += new_short - old_short
+
+    def _is_live(self, slot: int, jokers: int) -> bool:
+        return self._blocked[slot] == 0 and self._shortfall[slot] <= jokers
+
+    def live(self, template_id: str) -> List[int]:
+        """Indices of a template's variations that are still achievable."""
+        jokers = self.available[JOKER_ID]
+        slots = self.index.template_slots[template_id]
+        return [slot - slots.start for slot in slots if self._is_live(slot, jokers)]
+
+    def live_counts(self) -> Dict[str, int]:
+        """Number of live variations per template."""
+        jokers = self.available[JOKER_ID]
+        return {
+            template_id: sum(1 for slot in slots if self._is_live(slot, jokers))
+            for template_id, slots in self.index.template_slots.items()
+        }
+
+    def summary(self) -> Dict[str, dict]:
+        """Live and total variation counts per template, with the live indices."""
+        result = {}
+        for template_id, slots in self.index.template_slots.items():
+            live = self.live(template_id)
+            result[template_id] = {"live": len(live), "total": len(slots), "variations": live}
+        return result
+
+
+def prune(table: VariationTable, visible: Iterable[int]) -> LiveVariations:
+    """Build the live view for a visible-tile count vector."""
+    return LiveVariations(table, list(visible))
+
+
+def live_indices(table: VariationTable, template_id: str, visible: List[int]) -> List[int]:
+    """Indices of a template's variations still achievable with the given tiles visible.
+
+    Same answer as ``prune(table, visible).live(template_id)``, from one pass
+    over the table's shared packed records and without any per-variation
+    state, for callers that keep many visible-tile vectors (live tables).
+    """
+    unseen = [copies - seen for copies, seen in zip(TILE_COPIES, visible)]
+    jokers = unseen[JOKER_ID]
+    # Jokers only cover shortfalls; no variation needs one itself
+    unseen[JOKER_ID] = 0
+    have = pack_counts(unseen)
+    return [
+        index for index, (need, natural) in enumerate(table.packed_records(template_id))
+        if packed_deficit(natural, have) == 0 and packed_deficit(need, have) <= jokers
+    ]
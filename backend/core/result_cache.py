@@ -0,0 +1,261 @@
+"""
+Result cache for hand analyses.
+
+Analyses are keyed by (registry version, template id, canonical hand key).
+For templates whose variations are closed under relabelling the suits, the
+canonical key is the smallest suit relabelling of the hand, so hands that only
+differ by suit share one entry; the cached analysis is stored in the canonical
+suit labelling and mapped back on the way out.
+
+The in-process tier is a bounded LRU with an optional TTL. An optional SQLite
+tier can be shared by every worker on the host.
+
+Configuration (environment):
+    MAHJONGG_CACHE_SIZE   Maximum in-process entries (0 disables the cache)
+    MAHJONGG_CACHE_TTL    Seconds an entry stays valid (unset: forever)
+    MAHJONGG_CACHE_PATH   SQLite file for the shared tier (unset: disabled)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple
+
+from .analyzer import HandAnalysis, analyze_counts
+from .tiles import SUIT_PERMUTATIONS, TILE_IDS, TILE_KINDS, invert_mapping
+from .variation_table import VariationTable
+
+CacheKey = Tuple[str, str, bytes]
+
+DEFAULT_CACHE_SIZE = 10000
+
+# Gathers a count vector into each suit relabelling in one C-level call
+_RELABEL_GATHERS = [itemgetter(*invert_mapping(mapping)) for mapping in SUIT_PERMUTATIONS]
+
+# Bumped whenever the analyzer's results change, so shared entries written by
+# older workers are never served
+ANALYSIS_VERSION = 2
+
+# Seconds a shared-tier read or write waits for another process's lock. Misses
+# write on the event loop, so a busy store is skipped rather than waited on.
+SHARED_BUSY_TIMEOUT = 0.02
+
+
+def canonical_hand_key(counts: List[int]) -> Tuple[bytes, List[int]]:
+    """
+    Get the canonical key of a hand under suit relabelling.
+
+    Returns:
+        The key and the tile id mapping that takes the hand to it
+    """
+    best_key = None
+    best_mapping = SUIT_PERMUTATIONS[0]
+    for mapping, gather in zip(SUIT_PERMUTATIONS, _RELABEL_GATHERS):
+        key = bytes(gather(counts))
+        if best_key is None or key < best_key:
+            best_key, best_mapping = key, mapping
+    return best_key, best_mapping
+
+
+class SharedStore:
+    """SQLite-backed cache tier shared by every process on the host.
+
+    The tier is best effort: a read that fails (e.g. the database is locked
+    by another process) is a miss and a write that fails is skipped, counted
+    in ``errors``, instead of failing the request.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.errors = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SHARED_BUSY_TIMEOUT)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _failed(self):
+        with self._lock:
+            self.errors += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            row = self._connect().execute(
+                "SELECT value, expires FROM analyses WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            self._failed()
+            return None
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any], ttl: Optional[float]):
+        expires = time.time() + ttl if ttl is not None else None
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO analyses (key, value, expires) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires),
+                )
+        except sqlite3.Error:
+            self._failed()
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM analyses")
+
+
+class AnalysisCache:
+    """Bounded LRU cache of hand analyses with optional TTL and shared tier."""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE, ttl: Optional[float] = None,
+                 shared: Optional[SharedStore] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+        self._entries: "OrderedDict[CacheKey, Tuple[float, HandAnalysis]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: CacheKey) -> Optional[HandAnalysis]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, analysis = entry
+                if expires >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return analysis
+                del self._entries[key]
+
+        if self.shared is not None:
+            value = self.shared.get(self._shared_key(key))
+            if value is not None:
+                analysis = HandAnalysis(**value)
+                self._store(key, analysis)
+                with self._lock:
+                    self.shared_hits += 1
+                return analysis
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: CacheKey, analysis: HandAnalysis):
+        self._store(key, analysis)
+        if self.shared is not None:
+            self.shared.put(self._shared_key(key), asdict(analysis), self.ttl)
+
+    def _store(self, key: CacheKey, analysis: HandAnalysis):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            self._entries[key] = (expires, analysis)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    @staticmethod
+    def _shared_key(key: CacheKey) -> str:
+        version, template_id, hand_key = key
+        return f"{ANALYSIS_VERSION}:{version}:{template_id}:{hand_key.hex()}"
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                "shared_path": self.shared.path if self.shared is not None else None,
+                "shared_errors": self.shared.errors if self.shared is not None else 0,
+            }
+
+
+def _relabel(analysis: HandAnalysis, table: VariationTable, mapping: List[int]) -> HandAnalysis:
+    """Map an analysis through a tile id mapping."""
+    names = sorted(
+        (TILE_KINDS[mapping[TILE_IDS[name]]] for name in analysis.variation),
+        key=TILE_IDS.__getitem__,
+    )
+    need = [0] * len(TILE_KINDS)
+    for name in names:
+        need[TILE_IDS[name]] += 1
+    return HandAnalysis(
+        template_id=analysis.template_id,
+        distance=analysis.distance,
+        variation_index=table.find_variation(analysis.template_id, need),
+        variation=names,
+        jokers={TILE_KINDS[mapping[TILE_IDS[name]]]: used for name, used in analysis.jokers.items()},
+    )
+
+
+def analyze_cached(table: VariationTable, template_id: str, counts: List[int],
+                   cache: Optional[AnalysisCache]) -> HandAnalysis:
+    """Analyze a hand, reusing a cached analysis of it or of a suit-equivalent hand."""
+    if cache is None or cache.maxsize <= 0:
+        return analyze_counts(table, template_id, counts)
+
+    if table.is_suit_symmetric(template_id):
+        hand_key, mapping = canonical_hand_key(counts)
+    else:
+        hand_key, mapping = bytes(counts), SUIT_PERMUTATIONS[0]
+    key = (table.version, template_id, hand_key)
+
+    analysis = cache.get(key)
+    if analysis is None:
+        analysis = analyze_counts(table, template_id, list(hand_key))
+        cache.put(key, analysis)
+
+    if mapping is SUIT_PERMUTATIONS[0]:
+        return analysis
+    return _relabel(analysis, table, invert_mapping(mapping))
+
+
+_cache: Optional[AnalysisCache] = None
+
+
+def get_analysis_cache() -> AnalysisCache:
+    """Get the process-wide analysis cache configured from the environment."""
+    global _cache
+    if _cache is None:
+        ttl = os.environ.get("MAHJONGG_CACHE_TTL")
+        path = os.environ.get("MAHJONGG_CACHE_PATH")
+        _cache = AnalysisCache(
+            maxsize=int(os.environ.get("MAHJONGG_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+            ttl=float(ttl) if ttl else None,
+            shared=SharedStore(path) if path else None,
+        )
+    return _cache
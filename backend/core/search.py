@@ -0,0 +1,135 @@
+"""
+Tile-query search over every template variation.
+
+The index maps each (tile id, count) to the set of variations needing at
+least that many of the tile, stored as an integer bitset over variation
+slots. Queries combine those bitsets with AND/OR instead of scanning every
+variation, then rank the survivors by how many of the query's tiles they use.
+
+Example queries:
+
+    "hands that use 3 or more of 1B, 2B, 3B, 4B"
+        SearchQuery(tiles=[1B, 2B, 3B, 4B], min_overlap=3)
+
+    "hands containing a kong of 5s and any flowers"
+        SearchQuery(groups=[TileGroup(tiles=[5B, 5C, 5D], min_count=4),
+                            TileGroup(tiles=[FL], min_count=1)])
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from .tiles import NUM_TILE_KINDS
+from .variation_table import VariationTable, record_short_names
+
+# (template id, variation index)
+Slot = Tuple[str, int]
+
+
+@dataclass
+class TileGroup:
+    """Clause matching variations that need ``min_count`` of any one of ``tiles``."""
+    tiles: List[int]
+    min_count: int = 1
+
+
+@dataclass
+class SearchQuery:
+    """A tile query over all variations."""
+    tiles: List[int] = field(default_factory=list)  # Tile ids to overlap with (repeats count)
+    min_overlap: int = 0
+    groups: List[TileGroup] = field(default_factory=list)
+    limit: int = 50
+
+
+@dataclass
+class SearchHit:
+    template_id: str
+    variation_index: int
+    overlap: int
+    variation: List[str]
+
+
+@dataclass
+class SearchResult:
+    total: int                              # Variations matching the query
+    template_matches: Dict[str, int]        # Matching variations per template, best first
+    hits: List[SearchHit]                   # The top ``limit`` variations
+
+
+class VariationSearchIndex:
+    """Inverted index from (tile id, count) to variation slots."""
+
+    def __init__(self, table: VariationTable):
+        self.table = table
+        self.slots: List[Slot] = []
+        self._needs: List[bytes] = []
+        self._postings: Dict[Tuple[int, int], int] = {}
+        for template_id in table.template_ids:
+            for index, (need, _natural) in enumerate(table.records(template_id)):
+                bit = 1 << len(self.slots)
+                self.slots.append((template_id, index))
+                self._needs.append(bytes(need))
+                for kind, required in enumerate(need):
+                    for count in range(1, required + 1):
+                        key = (kind, count)
+                        self._postings[key] = self._postings.get(key, 0) | bit
+        self.all_slots = (1 << len(self.slots)) - 1
+
+    def postings(self, kind: int, count: int = 1) -> int:
+        """Bitset of the variations needing at least ``count`` of a tile."""
+        if count <= 0:
+            return self.all_slots
+        return self._postings.get((kind, count), 0)
+
+    def search(self, query: SearchQuery) -> SearchResult:
+        """Find variations matching a query, ranked by overlap with its tiles."""
+        candidates = self.all_slots
+        for group in query.groups:
+            matches = 0
+            for kind in group.tiles:
+                matches |= self.postings(kind, group.min_count)
+            candidates &= matches
+
+        wanted = [0] * NUM_TILE_KINDS
+        for kind in query.tiles:
+            wanted[kind] += 1
+        wanted_kinds = [(kind, count) for kind, count in enumerate(wanted) if count]
+
+        if query.min_overlap > 0:
+            # A variation must share at least one tile to reach any overlap
+            shares = 0
+            for kind, _count in wanted_kinds:
+                shares |= self.postings(kind)
+            candidates &= shares
+
+        hits = []
+        while candidates:
+            low = candidates & -candidates
+            slot = low.bit_length() - 1
+            candidates ^= low
+            need = self._needs[slot]
+            overlap = sum(min(count, need[kind]) for kind, count in wanted_kinds)
+            if overlap >= query.min_overlap:
+                hits.append((overlap, slot))
+
+        hits.sort(key=lambda hit: (-hit[0], hit[1]))
+        template_matches: Dict[str, int] = {}
+        for _overlap, slot in hits:
+            template_id = self.slots[slot][0]
+            template_matches[template_id] = template_matches.get(template_id, 0) + 1
+
+        results = []
+        for overlap, slot in hits[:query.limit]:
+            template_id, index = self.slots[slot]
+            results.append(SearchHit(
+                template_id=template_id,
+                variation_index=index,
+                overlap=overlap,
+                variation=record_short_names(self._needs[slot]),
+            ))
+        return SearchResult(total=len(hits), template_matches=template_matches, hits=results)
+
+
+def get_search_index(table: VariationTable) -> VariationSearchIndex:
+    """Get the search index of a table, built once and cached on the table."""
+    return table.shared_lookup("search_index", VariationSearchIndex)
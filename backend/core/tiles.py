@@ -1,6 +1,8 @@
 from enum import Enum, auto
 from dataclasses import dataclass
-from typing import List, Optional, Union, Dict, Any
+from functools import partial
+from itertools import permutations
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union, Any
 from pydantic import BaseModel, field_validator
 
 class Suit(str, Enum):
@@ -145,34 +147,125 @@ class JokerTile(Tile):
             full_name='Joker'
         )
 
+# Compact tile ids used by the compiled variation tables. Every physical kind of
+# tile in the 152-tile set gets one id; dragons map to their dragon type no
+# matter which suit they are written in (``RB`` is still a Red Dragon).
+TILE_KINDS: List[str] = (
+    [f"{number}{suit.value}" for suit in Suit for number in range(1, 10)]
+    + [direction.value for direction in WindDirection]
+    + [dragon.value for dragon in DragonType]
+    + ['FL', 'JK']
+)
+NUM_TILE_KINDS = len(TILE_KINDS)
+TILE_IDS: Dict[str, int] = {name: i for i, name in enumerate(TILE_KINDS)}
+FLOWER_ID = TILE_IDS['FL']
+JOKER_ID = TILE_IDS['JK']
+
+# Number of copies of each tile kind in a standard 152-tile set
+TILE_COPIES: List[int] = [8 if name in ('FL', 'JK') else 4 for name in TILE_KINDS]
+
+def tile_id(tile: Tile) -> int:
+    """Get the compact tile id for a tile."""
+    if isinstance(tile, DragonTile):
+        return TILE_IDS[tile.dragon_type.value]
+    return TILE_IDS[tile.short_name]
+
+class TileParseError(ValueError):
+    """Raised when a short name in a hand payload cannot be parsed."""
+    def __init__(self, position: int, short_name: Any, reason: str = "Unknown tile short name"):
+        self.position = position
+        self.short_name = short_name
+        super().__init__(f"{reason} at position {position}: {short_name!r}")
+
+def _build_short_name_table() -> Dict[str, Tuple[int, Callable[[], Tile]]]:
+    """Map every accepted (upper-case) spelling to its tile id and factory."""
+    table: Dict[str, Tuple[int, Callable[[], Tile]]] = {}
+    for suit in Suit:
+        for number in range(1, 10):
+            table[f"{number}{suit.value}"] = (
+                TILE_IDS[f"{number}{suit.value}"], partial(NumberedTile, number, suit))
+    for direction in WindDirection:
+        table[direction.value] = (TILE_IDS[direction.value], partial(WindTile, direction))
+    for dragon in DragonType:
+        kind = TILE_IDS[dragon.value]
+        for suit in Suit:
+            # Long form with an explicit suit, e.g. 'RDB' for Red in Bamboo
+            table[f"{dragon.value}{suit.value}"] = (kind, partial(DragonTile, dragon, suit))
+            # Suited short form as produced by DragonTile, e.g. 'RB'; the plain
+            # dragon names ('RD', 'GD', 'WD') keep their default suit
+            table.setdefault(f"{dragon.value[0]}{suit.value}", (kind, partial(DragonTile, dragon, suit)))
+        table[dragon.value] = (kind, partial(DragonTile, dragon))
+    table['FL'] = (FLOWER_ID, FlowerTile)
+    table['JK'] = (JOKER_ID, JokerTile)
+    return table
+
+_SHORT_NAME_TABLE = _build_short_name_table()
+
 def create_tile_from_short_name(short_name: str) -> Tile:
-    """Create a tile from its short name."""
-    # Handle numbered tiles (e.g., '1B', '5D', '9C')
-    if len(short_name) == 2 and short_name[0].isdigit() and short_name[1] in [s.value for s in Suit]:
-        number = int(short_name[0])
-        suit = Suit(short_name[1])
-        return NumberedTile(number=number, suit=suit)
-    
-    # Handle wind tiles (N, E, S, W)
-    try:
-        wind = WindDirection(short_name.upper())
-        return WindTile(wind)
-    except ValueError:
-        pass
-    
-    # Handle dragon tiles (RD, GD, WD or with suit like 'RB' for Red in Bamboo)
-    if len(short_name) == 2 and short_name.upper() in [dt.value for dt in DragonType]:
-        dragon_type = DragonType(short_name.upper())
-        return DragonTile(dragon_type)
-    elif len(short_name) == 3 and short_name[:2].upper() in [dt.value for dt in DragonType] and short_name[2] in [s.value for s in Suit]:
-        dragon_type = DragonType(short_name[:2].upper())
-        suit = Suit(short_name[2])
-        return DragonTile(dragon_type, suit)
+    """Create a tile from its short name (case-insensitive)."""
+    entry = _SHORT_NAME_TABLE.get(short_name.upper()) if isinstance(short_name, str) else None
+    if entry is None:
+        raise ValueError(f"Unknown tile short name: {short_name}")
+    return entry[1]()
+
+def parse_short_names(short_names: Iterable[str]) -> List[int]:
+    """
+    Convert a hand payload of short names into compact tile ids in one pass.
     
-    # Handle flower and joker
-    if short_name.upper() == 'FL':
-        return FlowerTile()
-    elif short_name.upper() == 'JK':
-        return JokerTile()
+    Short names are case-insensitive and may use the suited dragon forms
+    ('RB', 'RDB'). A hand may not hold more copies of a tile than the set has.
     
-    raise ValueError(f"Unknown tile short name: {short_name}")
+    Raises:
+        TileParseError: With the position of the first invalid short name
+    """
+    table = _SHORT_NAME_TABLE
+    counts = [0] * NUM_TILE_KINDS
+    tile_ids = []
+    for position, short_name in enumerate(short_names):
+        entry = table.get(short_name.upper()) if isinstance(short_name, str) else None
+        if entry is None:
+            raise TileParseError(position, short_name)
+        kind = entry[0]
+        counts[kind] += 1
+        if counts[kind] > TILE_COPIES[kind]:
+            raise TileParseError(position, short_name, f"More than {TILE_COPIES[kind]} copies of tile")
+        tile_ids.append(kind)
+    return tile_ids
+
+def ids_to_counts(tile_ids: Iterable[int]) -> List[int]:
+    """Count a list of compact tile ids."""
+    counts = [0] * NUM_TILE_KINDS
+    for kind in tile_ids:
+        counts[kind] += 1
+    return counts
+
+def _suit_permutation(target_suits: Tuple[Suit, ...]) -> List[int]:
+    """Tile id mapping that swaps suits (and their dragons) into ``target_suits``."""
+    dragon_for_suit = {dragon.suit: dragon for dragon in DragonType}
+    mapping = list(range(NUM_TILE_KINDS))
+    for suit, target in zip(Suit, target_suits):
+        for number in range(1, 10):
+            mapping[TILE_IDS[f"{number}{suit.value}"]] = TILE_IDS[f"{number}{target.value}"]
+        mapping[TILE_IDS[dragon_for_suit[suit].value]] = TILE_IDS[dragon_for_suit[target].value]
+    return mapping
+
+# Tile id mappings for every relabelling of the three suits; the first is the
+# identity. Hands related by one of these are equivalent for suit-symmetric
+# templates.
+SUIT_PERMUTATIONS: List[List[int]] = [
+    _suit_permutation(order) for order in permutations(Suit)
+]
+
+def permute_counts(counts, mapping: List[int]) -> List[int]:
+    """Relabel a count vector with a tile id mapping."""
+    permuted = [0] * NUM_TILE_KINDS
+    for kind, count in enumerate(counts):
+        permuted[mapping[kind]] = count
+    return permuted
+
+def invert_mapping(mapping: List[int]) -> List[int]:
+    """Invert a tile id mapping."""
+    inverse = [0] * len(mapping)
+    for kind, target in enumerate(mapping):
+        inverse[target] = kind
+    return inverse
@@ -0,0 +1,126 @@
+"""
+Variation interning.
+
+Templates can generate the same variation more than once - within one
+template, when two of its sets are interchangeable (e.g. the two pungs of
+even_chow_even_pungs_flowers, so swapping their suits repeats a variation),
+or across templates. The pool identifies every distinct (need, natural)
+record of a table once, with the list of (template, variation index) slots
+that use it, so a hand can be matched against all templates with one deficit
+computation per distinct record and the result fanned out to every slot.
+
+The pool keeps its own packed copy of each distinct record rather than
+reading the table's per-template packed records, which are budgeted and
+evicted least recently used: a pass over every template on each call would
+rebuild them all under a tight budget. The pool is a table-wide index (see
+``VariationTable.shared_lookup``), so its size is reported by the table's
+memory report and it is exempt from the budget.
+
+Analyses are identical to ``analyzer.analyze_counts`` for each template,
+including which variation wins a tie (the lowest index).
+"""
+from typing import Dict, List, Optional, Tuple
+
+from .analyzer import HAND_SIZE, HandAnalysis, build_analysis, pack_counts, packed_distance
+from .tiles import JOKER_ID
+from .variation_table import VariationTable
+
+
+class VariationPool:
+    """The distinct variation records of a table and the template slots using each."""
+
+    def __init__(self, table: VariationTable):
+        self.table = table
+        self.template_ids = table.template_ids
+        self._template_positions = {template_id: position
+                                    for position, template_id in enumerate(self.template_ids)}
+        # Distinct packed (need, natural) records
+        self.records: List[Tuple[int, int]] = []
+        # Per distinct record: (template position, variation index) of every use
+        self.refs: List[List[Tuple[int, int]]] = []
+        # Per template: the record position of each of its variations
+        self.template_records: List[List[int]] = []
+
+        positions: Dict[Tuple[bytes, bytes], int] = {}
+        for template_position, template_id in enumerate(self.template_ids):
+            self.template_records.append([])
+            for index, (need, natural) in enumerate(table.records(template_id)):
+                key = (bytes(need), bytes(natural))
+                position = positions.get(key)
+                if position is None:
+                    position = positions[key] = len(self.records)
+                    self.records.append((int.from_bytes(need, "little"),
+                                         int.from_bytes(natural, "little")))
+                    self.refs.append([])
+                self.refs[position].append((template_position, index))
+                self.template_records[template_position].append(position)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def record_position(self, template_id: str, index: int) -> int:
+        """Position in the pool of a template's variation."""
+        return self.template_records[self._template_positions[template_id]][index]
+
+    def references(self, position: int) -> Dict[str, List[int]]:
+        """Variation indices using a distinct record, by template."""
+        uses: Dict[str, List[int]] = {}
+        for template_position, index in self.refs[position]:
+            uses.setdefault(self.template_ids[template_position], []).append(index)
+        return uses
+
+    def shared_by(self, template_id: str, index: int) -> Dict[str, List[int]]:
+        """Every variation (including this one) identical to the given one, by template."""
+        return self.references(self.record_position(template_id, index))
+
+    def stats(self) -> dict:
+        """Sizes of the pool, separating repeats within a template from sharing across templates.
+
+        ``variations - distinct_variations`` equals
+        ``duplicates_within_templates + cross_template_references``.
+        """
+        variations = sum(len(refs) for refs in self.refs)
+        within = cross_records = cross_references = 0
+        for refs in self.refs:
+            templates = len({template_position for template_position, _ in refs})
+            within += len(refs) - templates
+            if templates > 1:
+                cross_records += 1
+                cross_references += templates - 1
+        return {
+            "templates": len(self.template_ids),
+            "variations": variations,
+            "distinct_variations": len(self.refs),
+            # Extra uses of a record by a template that already uses it
+            "duplicates_within_templates": within,
+            # Records used by more than one template, and their uses beyond the first template
+            "shared_across_templates": cross_records,
+            "cross_template_references": cross_references,
+        }
+
+    def analyze_all(self, counts: List[int],
+                    template_ids: Optional[List[str]] = None) -> Dict[str, HandAnalysis]:
+        """Closest variation of every template (or the given ones) to a hand."""
+        jokers = counts[JOKER_ID]
+        have = pack_counts(counts)
+        # One deficit computation per distinct record...
+        distances = [packed_distance(need, natural, have, jokers) for need, natural in self.records]
+
+        # ...fanned out to each template's variations
+        wanted = set(self.template_ids if template_ids is None else template_ids)
+        results = {}
+        for template_id, record_positions in zip(self.template_ids, self.template_records):
+            if template_id not in wanted:
+                continue
+            template_distances = [distances[position] for position in record_positions]
+            best_distance = min(template_distances, default=HAND_SIZE + 1)
+            # index() finds the first, i.e. lowest-index, closest variation
+            best_index = template_distances.index(best_distance) if template_distances else None
+            results[template_id] = build_analysis(self.table, template_id, counts,
+                                                  best_distance, best_index)
+        return results
+
+
+def get_variation_pool(table: VariationTable) -> VariationPool:
+    """Get the variation pool of a table, built once and cached on the table."""
+    return table.shared_lookup("variation_pool", VariationPool)
@@ -0,0 +1,428 @@
+"""
+Compiled variation tables.
+
+Every variation of every hand template is reduced to two count vectors over
+the compact tile ids in ``tiles.TILE_KINDS``: how many of each tile the
+variation needs, and how many of those must be natural tiles (singles, pairs
+and runs, which jokers cannot fill). The vectors for a whole registry are written
+into one binary file so that server workers can memory-map it read-only and
+share a single copy of the pages instead of each rebuilding the variations.
+The packed copies the analyzer reads are not part of that mapping; they are
+derived lookups, below.
+
+Lookups derived from a template's records (packed vectors, need indexes) are
+built on first use and kept within a memory budget, ``MAHJONGG_MEMORY_BUDGET``
+bytes (``K``/``M``/``G`` suffixes allowed; unset or 0 means unlimited). When
+the budget is exceeded the least recently used templates' lookups are dropped
+and rebuilt from the table on their next use.
+
+Indexes spanning the whole table (the dependency, search and difficulty
+indexes and the variation pool) are cached on the table with
+``shared_lookup``. They are reported by ``memory_report`` with their
+estimated sizes but are exempt from the budget: they are built once in the
+server parent before the workers fork and shared copy-on-write, and dropping
+one would only rebuild it whole, for every template, on its next use.
+
+File layout (all integers little-endian):
+
+    header  magic b"MJVT", format version (u16), tile kinds (u16),
+            template count (u32), data offset (u32)
+    index   per template: id length (u16), id (utf-8),
+            first record (u32), record count (u32)
+    data    per variation: need[kinds] + natural[kinds] as unsigned bytes
+
+Build a table file with:
+
+    python -m core.variation_table variations.bin
+"""
+import gzip
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from collections import OrderedDict
+from types import FunctionType, MethodType, ModuleType
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .tiles import NUM_TILE_KINDS, SUIT_PERMUTATIONS, TILE_KINDS, permute_counts, tile_id
+from .tilesets import TileSet, TileSetType
+from .hand_templates import HandTemplate, list_templates
+
+MAGIC = b"MJVT"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHII")
+_ID_LENGTH = struct.Struct("<H")
+_INDEX_ENTRY = struct.Struct("<II")
+
+# Set types that jokers may never stand in for, whatever their tiles
+NATURAL_SET_TYPES = {TileSetType.SINGLE, TileSetType.PAIR, TileSetType.EYES}
+
+# Environment variable pointing workers at a prebuilt table file
+TABLE_PATH_ENV = "MAHJONGG_VARIATION_TABLE"
+# Environment variable capping memory used by per-template lookups
+MEMORY_BUDGET_ENV = "MAHJONGG_MEMORY_BUDGET"
+
+_SIZE_SUFFIXES = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+Record = Tuple[memoryview, memoryview]
+
+
+def is_natural_set(tile_set: TileSet) -> bool:
+    """Whether a set's tiles must all be natural.
+
+    Jokers only stand in for pungs, kongs and larger groups of identical
+    tiles; singles, pairs and runs of different tiles (chows, sequences) are
+    natural.
+    """
+    if tile_set.set_type in NATURAL_SET_TYPES or len(tile_set.tiles) < 3:
+        return True
+    return len({tile_id(tile) for tile in tile_set.tiles}) > 1
+
+
+def compile_variation(variation: List[TileSet]) -> Tuple[bytes, bytes]:
+    """Compile a variation into its (need, natural) count vectors."""
+    need = [0] * NUM_TILE_KINDS
+    natural = [0] * NUM_TILE_KINDS
+    for tile_set in variation:
+        is_natural = is_natural_set(tile_set)
+        for tile in tile_set.tiles:
+            kind = tile_id(tile)
+            need[kind] += 1
+            if is_natural:
+                natural[kind] += 1
+    return bytes(need), bytes(natural)
+
+
+def build_table_bytes(templates: Optional[List[HandTemplate]] = None) -> bytes:
+    """Compile every variation of the given templates into the table format."""
+    if templates is None:
+        templates = list_templates()
+
+    index = bytearray()
+    data = bytearray()
+    record_count = 0
+    for template in templates:
+        records = [compile_variation(v) for v in template.generate_variations()]
+        encoded_id = template.template_id.encode("utf-8")
+        index += _ID_LENGTH.pack(len(encoded_id)) + encoded_id
+        index += _INDEX_ENTRY.pack(record_count, len(records))
+        for need, natural in records:
+            data += need
+            data += natural
+        record_count += len(records)
+
+    data_offset = _HEADER.size + len(index)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, NUM_TILE_KINDS, len(templates), data_offset)
+    return header + bytes(index) + bytes(data)
+
+
+def parse_memory_budget(value: Optional[str]) -> int:
+    """Parse a byte count such as ``"64M"``; empty means unlimited (0)."""
+    value = (value or "").strip().upper().rstrip("B")
+    if not value:
+        return 0
+    multiplier = _SIZE_SUFFIXES.get(value[-1], 1)
+    if multiplier > 1:
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+
+# Referenced by lookups and indexes but not owned by them
+_NOT_OWNED = (memoryview, mmap.mmap, type, ModuleType, FunctionType, MethodType)
+
+
+def estimate_size(obj: Any, _seen: Optional[set] = None) -> int:
+    """Approximate heap size of a lookup or index.
+
+    Follows containers and the attributes of plain objects, counting each
+    object once. The variation table, buffers and functions an index refers
+    to are not part of its size.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen or isinstance(obj, (VariationTable,) + _NOT_OWNED):
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += estimate_size(vars(obj), _seen)
+    return size
+
+
+class VariationTable:
+    """Read-only view over a compiled variation table.
+
+    The table works on any buffer - ``bytes`` built in-process or a read-only
+    ``mmap`` of a table file - and ``records``/``record`` hand out
+    ``memoryview`` slices of it without copying. The analyzer's hot loop
+    reads ``packed_records`` instead, a copy of a template's records as
+    Python integers: those copies belong to the process that built them
+    (shared copy-on-write when built in the server parent before the workers
+    fork) and are bounded by the memory budget like every derived lookup.
+    """
+
+    def __init__(self, buffer, source: Optional[str] = None, memory_budget: Optional[int] = None):
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        self.source = source
+
+        magic, version, num_kinds, num_templates, data_offset = _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a compiled variation table")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported variation table version: {version}")
+        if num_kinds != NUM_TILE_KINDS:
+            raise ValueError(
+                f"Variation table was built for {num_kinds} tile kinds, expected {NUM_TILE_KINDS}"
+            )
+
+        self.num_kinds = num_kinds
+        self.record_size = 2 * num_kinds
+        self._data_offset = data_offset
+        self._index: Dict[str, Tuple[int, int]] = {}
+
+        offset = _HEADER.size
+        for _ in range(num_templates):
+            (id_length,) = _ID_LENGTH.unpack_from(self._view, offset)
+            offset += _ID_LENGTH.size
+            template_id = bytes(self._view[offset:offset + id_length]).decode("utf-8")
+            offset += id_length
+            self._index[template_id] = _INDEX_ENTRY.unpack_from(self._view, offset)
+            offset += _INDEX_ENTRY.size
+
+        # Identifies the compiled registry; changes whenever any variation does
+        self.version = hashlib.sha1(self._view).hexdigest()[:12]
+
+        # Lazily built per-template lookups, keyed by (template id, lookup name)
+        # in least recently used order, with their estimated sizes
+        if memory_budget is None:
+            memory_budget = parse_memory_budget(os.environ.get(MEMORY_BUDGET_ENV))
+        self.memory_budget = memory_budget
+        self._symmetric: Dict[str, bool] = {}
+        self._compressed: Optional[bytes] = None
+        self._derived: "OrderedDict[Tuple[str, str], Tuple[Any, int]]" = OrderedDict()
+        self._derived_bytes = 0
+        # Table-wide indexes by name, with their estimated sizes
+        self._indexes: Dict[str, Tuple[Any, int]] = {}
+        self.lookup_hits = 0
+        self.lookup_builds = 0
+        self.lookup_evictions = 0
+
+    def __contains__(self, template_id: str) -> bool:
+        return template_id in self._index
+
+    def __len__(self) -> int:
+        return sum(count for _, count in self._index.values())
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the underlying table in bytes."""
+        return self._view.nbytes
+
+    def to_bytes(self) -> bytes:
+        """Copy of the whole table in the file format."""
+        return bytes(self._view)
+
+    def compressed(self) -> bytes:
+        """The table in the file format, gzip-compressed once and reused."""
+        if self._compressed is None:
+            # A fixed mtime keeps the output identical for identical tables
+            self._compressed = gzip.compress(self._view, compresslevel=9, mtime=0)
+        return self._compressed
+
+    @property
+    def template_ids(self) -> List[str]:
+        """Ids of the templates in the table, in build order."""
+        return list(self._index)
+
+    def variation_count(self, template_id: str) -> int:
+        """Number of compiled variations for a template."""
+        return self._index[template_id][1]
+
+    def record(self, template_id: str, index: int) -> Record:
+        """Get the (need, natural) vectors of one variation."""
+        first, count = self._index[template_id]
+        if not 0 <= index < count:
+            raise IndexError(f"Variation {index} out of range for {template_id}")
+        start = self._data_offset + (first + index) * self.record_size
+        return (
+            self._view[start:start + self.num_kinds],
+            self._view[start + self.num_kinds:start + self.record_size],
+        )
+
+    def records(self, template_id: str) -> Iterator[Record]:
+        """Iterate over the (need, natural) vectors of a template's variations."""
+        first, count = self._index[template_id]
+        start = self._data_offset + first * self.record_size
+        kinds = self.num_kinds
+        for _ in range(count):
+            yield self._view[start:start + kinds], self._view[start + kinds:start + self.record_size]
+            start += self.record_size
+
+    def _derived_lookup(self, template_id: str, name: str, build: Callable[[str], Any]) -> Any:
+        """Get a per-template lookup, building it and enforcing the memory budget."""
+        key = (template_id, name)
+        entry = self._derived.get(key)
+        if entry is not None:
+            self._derived.move_to_end(key)
+            self.lookup_hits += 1
+            return entry[0]
+
+        value = build(template_id)
+        size = estimate_size(value)
+        self._derived[key] = (value, size)
+        self._derived_bytes += size
+        self.lookup_builds += 1
+        if self.memory_budget:
+            # Never evict the lookup just built, even if it alone exceeds the budget
+            while self._derived_bytes > self.memory_budget and len(self._derived) > 1:
+                _, (_, evicted_size) = self._derived.popitem(last=False)
+                self._derived_bytes -= evicted_size
+                self.lookup_evictions += 1
+        return value
+
+    def _build_packed(self, template_id: str) -> List[Tuple[int, int]]:
+        return [
+            (int.from_bytes(need, "little"), int.from_bytes(natural, "little"))
+            for need, natural in self.records(template_id)
+        ]
+
+    def _build_need_index(self, template_id: str) -> Dict[bytes, int]:
+        lookup: Dict[bytes, int] = {}
+        for index, (record_need, _natural) in enumerate(self.records(template_id)):
+            lookup.setdefault(bytes(record_need), index)
+        return lookup
+
+    def packed_records(self, template_id: str) -> List[Tuple[int, int]]:
+        """A template's (need, natural) vectors packed into integers, one byte per kind.
+
+        Built on first use and kept while the memory budget allows; this is
+        what the analyzer's hot loop reads.
+        """
+        return self._derived_lookup(template_id, "packed", self._build_packed)
+
+    def find_variation(self, template_id: str, need) -> Optional[int]:
+        """Get the index of the variation with the given need vector, if any."""
+        return self._derived_lookup(template_id, "need_index", self._build_need_index).get(bytes(need))
+
+    def shared_lookup(self, name: str, build: Callable[["VariationTable"], Any]) -> Any:
+        """Get a table-wide index, building it on first use.
+
+        Indexes are counted in ``memory_report`` but never evicted (see the
+        module docstring).
+        """
+        entry = self._indexes.get(name)
+        if entry is None:
+            value = build(self)
+            entry = self._indexes[name] = (value, estimate_size(value))
+        return entry[0]
+
+    def memory_report(self) -> dict:
+        """Memory used by the table, its table-wide indexes and each template's resident lookups."""
+        templates = {
+            template_id: {"table_bytes": count * self.record_size, "lookup_bytes": 0, "lookups": []}
+            for template_id, (_, count) in self._index.items()
+        }
+        for (template_id, name), (_, size) in self._derived.items():
+            templates[template_id]["lookup_bytes"] += size
+            templates[template_id]["lookups"].append(name)
+        return {
+            "source": self.source,
+            "table_bytes": self.nbytes,
+            "mapped": isinstance(self._buffer, mmap.mmap),
+            "lookup_bytes": self._derived_bytes,
+            "memory_budget": self.memory_budget,
+            # Outside the budget; see shared_lookup
+            "index_bytes": sum(size for _, size in self._indexes.values()),
+            "indexes": {name: size for name, (_, size) in self._indexes.items()},
+            "hits": self.lookup_hits,
+            "builds": self.lookup_builds,
+            "evictions": self.lookup_evictions,
+            "templates": templates,
+        }
+
+    def is_suit_symmetric(self, template_id: str) -> bool:
+        """Whether relabelling the suits maps the template's variations onto themselves.
+
+        Analyses of symmetric templates can be shared between hands that only
+        differ by a suit relabelling.
+        """
+        symmetric = self._symmetric.get(template_id)
+        if symmetric is None:
+            records = {(bytes(need), bytes(natural)) for need, natural in self.records(template_id)}
+            symmetric = all(
+                (bytes(permute_counts(need, mapping)), bytes(permute_counts(natural, mapping))) in records
+                for mapping in SUIT_PERMUTATIONS[1:]
+                for need, natural in records
+            )
+            self._symmetric[template_id] = symmetric
+        return symmetric
+
+    def close(self):
+        """Release the underlying buffer."""
+        self._view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+
+def record_short_names(need) -> List[str]:
+    """Expand a need vector back into a sorted list of tile short names."""
+    return [TILE_KINDS[kind] for kind, count in enumerate(need) for _ in range(count)]
+
+
+def build_variation_table(templates: Optional[List[HandTemplate]] = None) -> VariationTable:
+    """Compile templates into an in-memory variation table."""
+    return VariationTable(build_table_bytes(templates), source="memory")
+
+
+def write_variation_table(path: str, templates: Optional[List[HandTemplate]] = None) -> int:
+    """Compile templates into a table file. Returns the number of bytes written."""
+    data = build_table_bytes(templates)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    # Replace atomically so running workers never map a half-written file
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def open_variation_table(path: str) -> VariationTable:
+    """Memory-map a table file read-only."""
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return VariationTable(buffer, source=path)
+
+
+_table: Optional[VariationTable] = None
+
+
+def get_variation_table() -> VariationTable:
+    """Get the process-wide variation table.
+
+    Maps the file named by ``MAHJONGG_VARIATION_TABLE`` when it is set,
+    otherwise compiles the registered templates in memory.
+    """
+    global _table
+    if _table is None:
+        path = os.environ.get(TABLE_PATH_ENV)
+        _table = open_variation_table(path) if path else build_variation_table()
+    return _table
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build a compiled variation table file")
+    parser.add_argument("output", help="Path of the table file to write")
+    args = parser.parse_args()
+
+    size = write_variation_table(args.output)
+    table = open_variation_table(args.output)
+    print(f"Wrote {len(table)} variations of {len(table.template_ids)} templates "
+          f"({size} bytes, version {table.version}) to {args.output}")
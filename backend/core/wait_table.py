@@ -0,0 +1,258 @@
+"""
+Precomputed winning-tile (wait) table.
+
+A variation is completed by its own tiles, or by them with jokers standing in
+for any of its group tiles (pungs, kongs and larger groups of identical
+tiles, never singles, pairs or runs), up to the set's eight jokers. Removing
+one tile - a natural one or a joker - from any such complete hand gives a
+13-tile "one-away" state whose winning tile is the removed one. The table
+maps every such state to the winning tiles per template, so "what am I
+waiting on" is a single binary search, for hands with or without jokers. A
+joker is listed as a winning tile whenever the missing tile belongs to a
+group that still has room for one.
+
+Like the variation table, the wait table is a flat binary file that can be
+memory-mapped read-only and shared between workers.
+
+File layout (all integers little-endian):
+
+    header   magic b"MJWT", format version (u16), tile kinds (u16),
+             template count (u32), record count (u32), variation table
+             version (12 ascii bytes)
+    ids      per template: id length (u16), id (utf-8)
+    records  sorted by state, then template:
+             state (13 tile ids, ascending), template index (u16),
+             winning tiles (u64 bitmask over tile ids)
+
+Build a wait table file with:
+
+    python -m core.wait_table waits.bin
+"""
+import mmap
+import os
+import struct
+from itertools import product
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .analyzer import analyze_counts
+from .tiles import JOKER_ID, NUM_TILE_KINDS, TILE_COPIES, TILE_KINDS
+from .variation_table import VariationTable, get_variation_table
+
+MAGIC = b"MJWT"
+# Version 2 added the states of hands holding jokers
+FORMAT_VERSION = 2
+STATE_SIZE = 13
+
+_HEADER = struct.Struct("<4sHHII12s")
+_ID_LENGTH = struct.Struct("<H")
+_RECORD = struct.Struct(f"<{STATE_SIZE}sHQ")
+
+# Environment variable pointing workers at a prebuilt wait table file
+WAIT_TABLE_PATH_ENV = "MAHJONGG_WAIT_TABLE"
+
+
+def state_key(counts) -> Optional[bytes]:
+    """Encode a 13-tile count vector as its ascending tile ids, or None if not 13 tiles."""
+    key = bytes(kind for kind, count in enumerate(counts) for _ in range(count))
+    return key if len(key) == STATE_SIZE else None
+
+
+def complete_hands(need, natural) -> Iterator[List[int]]:
+    """Every hand that completes a variation, with jokers for some of its group tiles."""
+    groups = [(kind, required - natural[kind]) for kind, required in enumerate(need)
+              if required > natural[kind]]
+    max_jokers = TILE_COPIES[JOKER_ID]
+    for jokers in product(*(range(min(slots, max_jokers) + 1) for _, slots in groups)):
+        if sum(jokers) > max_jokers:
+            continue
+        hand = list(need)
+        for (kind, _), used in zip(groups, jokers):
+            hand[kind] -= used
+            hand[JOKER_ID] += used
+        yield hand
+
+
+def build_wait_table_bytes(table: VariationTable) -> bytes:
+    """Compute every one-away state of every variation in a variation table."""
+    template_ids = table.template_ids
+    waits: Dict[Tuple[bytes, int], int] = {}
+    for template_index, template_id in enumerate(template_ids):
+        for need, natural in table.records(template_id):
+            for hand in complete_hands(need, natural):
+                for kind, held in enumerate(hand):
+                    if not held:
+                        continue
+                    hand[kind] -= 1
+                    key = state_key(hand)
+                    hand[kind] += 1
+                    if key is None:
+                        continue
+                    # Drawing the removed tile completes the hand again
+                    waits[(key, template_index)] = waits.get((key, template_index), 0) | 1 << kind
+
+    ids = bytearray()
+    for template_id in template_ids:
+        encoded = template_id.encode("utf-8")
+        ids += _ID_LENGTH.pack(len(encoded)) + encoded
+    records = bytearray()
+    for (key, template_index), mask in sorted(waits.items()):
+        records += _RECORD.pack(key, template_index, mask)
+
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, NUM_TILE_KINDS, len(template_ids),
+                          len(waits), table.version.encode("ascii"))
+    return header + bytes(ids) + bytes(records)
+
+
+class WaitTable:
+    """Read-only view over a wait table buffer (``bytes`` or ``mmap``)."""
+
+    def __init__(self, buffer, source: Optional[str] = None):
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        self.source = source
+
+        magic, version, num_kinds, num_templates, num_records, table_version = \
+            _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a wait table")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported wait table version: {version}")
+        if num_kinds != NUM_TILE_KINDS:
+            raise ValueError(
+                f"Wait table was built for {num_kinds} tile kinds, expected {NUM_TILE_KINDS}"
+            )
+        self.table_version = table_version.decode("ascii")
+
+        offset = _HEADER.size
+        self.template_ids: List[str] = []
+        for _ in range(num_templates):
+            (id_length,) = _ID_LENGTH.unpack_from(self._view, offset)
+            offset += _ID_LENGTH.size
+            self.template_ids.append(bytes(self._view[offset:offset + id_length]).decode("utf-8"))
+            offset += id_length
+
+        self._records_offset = offset
+        self._count = num_records
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return self._view.nbytes
+
+    def memory_report(self) -> dict:
+        """Size of the wait table and whether it is mapped from a file."""
+        return {
+            "source": self.source,
+            "table_bytes": self.nbytes,
+            "mapped": isinstance(self._buffer, mmap.mmap),
+        }
+
+    def _key(self, index: int) -> bytes:
+        start = self._records_offset + index * _RECORD.size
+        return bytes(self._view[start:start + STATE_SIZE])
+
+    def lookup(self, counts) -> Dict[str, List[str]]:
+        """Winning tiles per template for a 13-tile hand; empty if not one away."""
+        key = state_key(counts)
+        if key is None:
+            return {}
+
+        # Binary search over the fixed-size records without materialising keys
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        waits = {}
+        index = lo
+        while index < self._count and self._key(index) == key:
+            _state, template_index, mask = _RECORD.unpack_from(
+                self._view, self._records_offset + index * _RECORD.size)
+            waits[self.template_ids[template_index]] = [
+                TILE_KINDS[kind] for kind in range(NUM_TILE_KINDS) if mask >> kind & 1
+            ]
+            index += 1
+        return waits
+
+
+def scan_waits(table: VariationTable, counts: List[int]) -> Dict[str, List[str]]:
+    """
+    Winning tiles per template found by analyzing every possible draw.
+
+    Reference answer for ``WaitTable.lookup``, which must agree with it for
+    every hand, with or without jokers.
+    """
+    if sum(counts) != STATE_SIZE:
+        return {}
+    counts = list(counts)
+    waits: Dict[str, List[str]] = {}
+    for kind in range(NUM_TILE_KINDS):
+        if counts[kind] >= TILE_COPIES[kind]:
+            continue
+        counts[kind] += 1
+        for template_id in table.template_ids:
+            if analyze_counts(table, template_id, counts).is_match:
+                waits.setdefault(template_id, []).append(TILE_KINDS[kind])
+        counts[kind] -= 1
+    return waits
+
+
+def write_wait_table(path: str, table: Optional[VariationTable] = None) -> int:
+    """Write a wait table file. Returns the number of bytes written."""
+    data = build_wait_table_bytes(table or get_variation_table())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def open_wait_table(path: str) -> WaitTable:
+    """Memory-map a wait table file read-only."""
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return WaitTable(buffer, source=path)
+
+
+_wait_table: Optional[WaitTable] = None
+
+
+def get_wait_table() -> WaitTable:
+    """Get the process-wide wait table.
+
+    Maps the file named by ``MAHJONGG_WAIT_TABLE`` when it is set, otherwise
+    builds it in memory from the variation table. A file in another format,
+    or built for a different variation table version, is rebuilt rather than
+    trusted.
+    """
+    global _wait_table
+    table = get_variation_table()
+    if _wait_table is None or _wait_table.table_version != table.version:
+        path = os.environ.get(WAIT_TABLE_PATH_ENV)
+        wait_table = None
+        if path:
+            try:
+                wait_table = open_wait_table(path)
+            except ValueError:
+                # E.g. a file written in an older format; build a current one instead
+                pass
+        if wait_table is None or wait_table.table_version != table.version:
+            wait_table = WaitTable(build_wait_table_bytes(table), source="memory")
+        _wait_table = wait_table
+    return _wait_table
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build a wait table file")
+    parser.add_argument("output", help="Path of the wait table file to write")
+    args = parser.parse_args()
+
+    size = write_wait_table(args.output)
+    print(f"Wrote {len(open_wait_table(args.output))} one-away states ({size} bytes) to {args.output}")
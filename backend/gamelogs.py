@@ -0,0 +1,340 @@
+"""
+Streaming game-log ingestion and aggregation.
+
+Replays recorded games to rebuild each player's hand at every turn, computes
+its distance to every template and aggregates how often, and how early, each
+hand was reachable.
+
+Logs are JSON lines, one event per line; events of different games may be
+interleaved but each game's events are in order:
+
+    {"game": "g1", "seat": 0, "action": "deal", "tiles": ["1B", "3C", ...]}
+    {"game": "g1", "seat": 0, "action": "draw", "tiles": ["5D"]}
+    {"game": "g1", "seat": 0, "action": "discard", "tiles": ["N"]}
+    {"game": "g1", "seat": 1, "action": "call", "tiles": ["N"]}
+    {"game": "g1", "seat": 1, "action": "expose", "tiles": ["N", "N", "N"]}
+    {"game": "g1", "action": "end"}
+
+``deal``, ``draw`` and ``call`` add tiles to the seat's hand and ``discard``
+removes them; exposed tiles stay part of the hand. Hands are analyzed after
+each event that adds tiles, and a seat's turn is the number of draws and
+calls it has made.
+
+Files are read in fixed-size chunks and each event is routed to a worker
+process by game id through bounded queues, so memory stays bounded however
+large the archive and a single large file still uses every worker. The result
+is written column by column: one array per statistic, one entry per template.
+
+Usage (from the backend directory):
+
+    python -m gamelogs archive/*.jsonl --output stats.json --workers 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import re
+import sys
+import time
+import zlib
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.analyzer import HAND_SIZE
+from core.result_cache import analyze_cached, get_analysis_cache
+from core.tiles import NUM_TILE_KINDS, TILE_COPIES, parse_short_names
+from core.variation_table import get_variation_table
+
+DEFAULT_CHUNK_LINES = 5000
+# Chunks buffered per worker before the reader blocks
+QUEUE_DEPTH = 4
+
+ADDING_ACTIONS = {"deal", "draw", "call"}
+
+# Seconds between liveness checks while waiting on a worker's queue
+WORKER_POLL_INTERVAL = 1.0
+
+# The game id of an event line, found without parsing the whole line
+_GAME_ID = re.compile(r'"game"\s*:\s*(?:"((?:[^"\\]|\\.)*)"|([^\s,}\]]+))')
+
+
+class TemplateStats:
+    """Aggregates for one template over finished player-games."""
+
+    def __init__(self):
+        self.player_games = 0
+        self.reached = 0
+        self.reach_turn_total = 0
+        # best distance achieved per player-game, 0..HAND_SIZE
+        self.best_distance = [0] * (HAND_SIZE + 1)
+        # turn at which the hand was first complete
+        self.reach_turns: Dict[int, int] = {}
+
+    def add(self, best: int, reach_turn: Optional[int]):
+        self.player_games += 1
+        self.best_distance[min(best, HAND_SIZE)] += 1
+        if reach_turn is not None:
+            self.reached += 1
+            self.reach_turn_total += reach_turn
+            self.reach_turns[reach_turn] = self.reach_turns.get(reach_turn, 0) + 1
+
+    def merge(self, other: "TemplateStats"):
+        self.player_games += other.player_games
+        self.reached += other.reached
+        self.reach_turn_total += other.reach_turn_total
+        for distance, count in enumerate(other.best_distance):
+            self.best_distance[distance] += count
+        for turn, count in other.reach_turns.items():
+            self.reach_turns[turn] = self.reach_turns.get(turn, 0) + count
+
+
+class PlayerState:
+    """A seat's hand in a game being replayed."""
+    __slots__ = ("counts", "turn", "best", "reach_turn")
+
+    def __init__(self, template_count: int):
+        self.counts = [0] * NUM_TILE_KINDS
+        self.turn = 0
+        self.best = [HAND_SIZE] * template_count
+        self.reach_turn: List[Optional[int]] = [None] * template_count
+
+
+class GameAggregator:
+    """Replays events and accumulates per-template statistics."""
+
+    def __init__(self, template_ids: List[str]):
+        self.template_ids = template_ids
+        self.table = get_variation_table()
+        self.cache = get_analysis_cache()
+        self.stats = {template_id: TemplateStats() for template_id in template_ids}
+        self.games: Dict[str, Dict[int, PlayerState]] = {}
+        self.events = 0
+        self.errors = 0
+
+    def process_line(self, line: str):
+        self.events += 1
+        try:
+            event = json.loads(line)
+            self.process(event)
+        except Exception:
+            # Any malformed event is rejected on its own, never the whole run
+            self.errors += 1
+
+    def process(self, event: dict):
+        game_id = str(event["game"])
+        action = event["action"]
+        if action == "end":
+            self.finish_game(game_id)
+            return
+
+        seat = int(event["seat"])
+        tiles = parse_short_names(event.get("tiles", []))
+        if action not in ADDING_ACTIONS and action not in ("discard", "expose"):
+            raise ValueError(f"Unknown action: {action}")
+        seats = self.games.get(game_id, {})
+        player = seats.get(seat)
+        counts = list(player.counts) if player is not None else [0] * NUM_TILE_KINDS
+
+        # Work on a copy so a rejected event leaves the player untouched
+        if action in ADDING_ACTIONS:
+            for kind in tiles:
+                if counts[kind] >= TILE_COPIES[kind]:
+                    raise ValueError("More copies of a tile than the set holds")
+                counts[kind] += 1
+        elif action == "discard":
+            for kind in tiles:
+                if counts[kind] == 0:
+                    raise ValueError("Discarded a tile not in the hand")
+                counts[kind] -= 1
+
+        if player is None:
+            player = self.games.setdefault(game_id, {})[seat] = PlayerState(len(self.template_ids))
+        player.counts = counts
+        if action in ADDING_ACTIONS:
+            if action != "deal":
+                player.turn += 1
+            self._analyze(player)
+
+    def _analyze(self, player: PlayerState):
+        for i, template_id in enumerate(self.template_ids):
+            distance = analyze_cached(self.table, template_id, player.counts, self.cache).distance
+            if distance < player.best[i]:
+                player.best[i] = distance
+            if distance == 0 and player.reach_turn[i] is None:
+                player.reach_turn[i] = player.turn
+
+    def finish_game(self, game_id: str):
+        for player in self.games.pop(game_id, {}).values():
+            for i, template_id in enumerate(self.template_ids):
+                self.stats[template_id].add(player.best[i], player.reach_turn[i])
+
+    def finish(self) -> Tuple[Dict[str, TemplateStats], int, int]:
+        """Close games that never logged an end event and return the totals."""
+        for game_id in list(self.games):
+            self.finish_game(game_id)
+        return self.stats, self.events, self.errors
+
+
+def _game_id(line: str) -> str:
+    """The raw game id of an event line, used only to pick its worker."""
+    match = _GAME_ID.search(line)
+    if match is None:
+        return ""
+    return match.group(1) if match.group(1) is not None else match.group(2)
+
+
+class WorkerDied(RuntimeError):
+    """Raised when an ingestion worker exits without reporting its results."""
+
+
+def _check_alive(processes):
+    for process in processes:
+        if not process.is_alive() and process.exitcode != 0:
+            raise WorkerDied(f"Ingestion worker {process.pid} exited with code {process.exitcode}")
+
+
+def _put(queue_in, item, processes):
+    while True:
+        try:
+            queue_in.put(item, timeout=WORKER_POLL_INTERVAL)
+            return
+        except queue.Full:
+            _check_alive(processes)
+
+
+def _worker(template_ids: List[str], lines_in, results_out):
+    aggregator = GameAggregator(template_ids)
+    for chunk in iter(lines_in.get, None):
+        for line in chunk:
+            aggregator.process_line(line)
+    results_out.put(aggregator.finish())
+
+
+def _read_chunks(paths: Iterable[str], chunk_lines: int) -> Iterable[List[str]]:
+    for path in paths:
+        stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+        try:
+            while True:
+                chunk = list(islice(stream, chunk_lines))
+                if not chunk:
+                    break
+                chunk = [line for line in chunk if line.strip()]
+                if chunk:
+                    yield chunk
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def ingest(paths: List[str], template_ids: Optional[List[str]] = None, workers: int = 1,
+           chunk_lines: int = DEFAULT_CHUNK_LINES) -> Tuple[Dict[str, TemplateStats], int, int]:
+    """
+    Stream game logs through the aggregation pipeline.
+
+    Returns:
+        (per-template statistics, events read, events rejected)
+    """
+    if template_ids is None:
+        template_ids = get_variation_table().template_ids
+
+    if workers <= 1:
+        aggregator = GameAggregator(template_ids)
+        for chunk in _read_chunks(paths, chunk_lines):
+            for line in chunk:
+                aggregator.process_line(line)
+        return aggregator.finish()
+
+    results = multiprocessing.Queue()
+    queues = [multiprocessing.Queue(QUEUE_DEPTH) for _ in range(workers)]
+    processes = [
+        multiprocessing.Process(target=_worker, args=(template_ids, queue, results), daemon=True)
+        for queue in queues
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        # Route every event of a game to the same worker so its hands stay whole
+        for chunk in _read_chunks(paths, chunk_lines):
+            shards: List[List[str]] = [[] for _ in range(workers)]
+            for line in chunk:
+                shards[zlib.crc32(_game_id(line).encode()) % workers].append(line)
+            for queue_in, shard in zip(queues, shards):
+                if shard:
+                    _put(queue_in, shard, processes)
+        for queue_in in queues:
+            _put(queue_in, None, processes)
+
+        stats = {template_id: TemplateStats() for template_id in template_ids}
+        events = errors = 0
+        received = 0
+        while received < len(processes):
+            try:
+                worker_stats, worker_events, worker_errors = results.get(timeout=WORKER_POLL_INTERVAL)
+            except queue.Empty:
+                _check_alive(processes)
+                continue
+            received += 1
+            for template_id, template_stats in worker_stats.items():
+                stats[template_id].merge(template_stats)
+            events += worker_events
+            errors += worker_errors
+    except BaseException:
+        for process in processes:
+            process.terminate()
+        raise
+    for process in processes:
+        process.join()
+    return stats, events, errors
+
+
+def to_columns(stats: Dict[str, TemplateStats]) -> dict:
+    """Lay the statistics out column by column, one entry per template."""
+    rows = list(stats.items())
+    return {
+        "template_id": [template_id for template_id, _ in rows],
+        "player_games": [s.player_games for _, s in rows],
+        "reached": [s.reached for _, s in rows],
+        "reach_rate": [round(s.reached / s.player_games, 6) if s.player_games else 0.0 for _, s in rows],
+        "mean_reach_turn": [round(s.reach_turn_total / s.reached, 3) if s.reached else None for _, s in rows],
+        "best_distance_histogram": [s.best_distance for _, s in rows],
+        "reach_turn_histogram": [
+            [s.reach_turns.get(turn, 0) for turn in range(max(s.reach_turns, default=-1) + 1)]
+            for _, s in rows
+        ],
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Aggregate hand statistics from game logs")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="Log files (default or '-': stdin)")
+    parser.add_argument("--output", "-o", help="Write the columnar JSON here (default: stdout)")
+    parser.add_argument("--template", action="append", dest="templates",
+                        help="Template id to track (repeatable; default: all)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--chunk-lines", type=int, default=DEFAULT_CHUNK_LINES,
+                        help="Lines read per chunk")
+    args = parser.parse_args(argv)
+
+    table = get_variation_table()
+    unknown = [t for t in args.templates or [] if t not in table]
+    if unknown:
+        parser.error(f"Unknown template(s): {', '.join(unknown)}")
+
+    started = time.perf_counter()
+    stats, events, errors = ingest(args.inputs or ["-"], args.templates, args.workers, args.chunk_lines)
+    body = json.dumps(to_columns(stats), separators=(",", ":"))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(body + "\n")
+    else:
+        print(body)
+
+    elapsed = time.perf_counter() - started
+    print(f"Ingested {events} events ({errors} rejected) in {elapsed:.2f}s "
+          f"with {args.workers} worker(s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
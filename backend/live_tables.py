@@ -0,0 +1,376 @@
+"""
+Live four-player game tables.
+
+Each table keeps its whole state in compact arrays of tile ids: the seeded
+wall from ``core.dealer``, a count vector per seat (concealed plus exposed
+tiles), a count vector of each seat's exposures and the discard pile, plus
+the last distance sent to each seat per template. A table's size is bounded
+by the tile set and the number of templates; it holds nothing per variation.
+Tables nobody watches are dropped once finished or idle.
+
+Clients connect over WebSocket, optionally to a seat, and receive a snapshot
+followed by one small delta per move:
+
+    {"seq": 12, "seat": 2, "action": "discard", "tiles": ["5B"], "turn": 3,
+     "phase": "draw", "wall": 87}
+
+The seated player additionally receives the tiles it drew and the templates
+whose distance changed for its hand, so hands stay private. Analyses for all
+seats affected by a move are computed together after the move: the mover's
+hand changes on every move, and a discard removes tiles from play for every
+seat. Variations made impossible by the discard pile are skipped, found from
+the pile's counts and the table's shared packed records on each move
+(``core.pruning.live_indices``). Only tiles lying in the pile are pruned on: a
+called discard goes back into play, so no seat's analysis is ever pruned by
+a tile that seat holds.
+
+Moves are JSON messages on the same socket:
+
+    {"action": "draw"}
+    {"action": "discard", "tiles": ["5B"]}
+    {"action": "call", "tiles": ["5B", "5B", "JK"]}    exposure incl. the discard
+    {"action": "mahjong"}
+
+Each connection has a bounded outgoing queue; a client that falls that far
+behind is disconnected and gets a fresh snapshot when it reconnects.
+
+Tables live in the memory of the process that created them. Under the
+preforked server (serve.py) with more than one worker, requests for a table
+would land on workers that do not hold it, so the registry is disabled there
+and every table endpoint answers 503. Host live tables from a single-worker
+server.
+"""
+import asyncio
+import os
+import random
+import secrets
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from core.analyzer import HAND_SIZE, analyze_counts
+from core.catalog import dumps
+from core.dealer import DEFAULT_HAND_SIZE, DEFAULT_PLAYERS, Wall
+from core.pruning import live_indices
+from core.tiles import JOKER_ID, NUM_TILE_KINDS, TILE_KINDS, parse_short_names
+from core.variation_table import VariationTable, get_variation_table
+
+DEFAULT_MAX_TABLES = 5000
+# Seconds an unwatched table may go without a move before it is dropped
+DEFAULT_IDLE_TIMEOUT = 3600.0
+# Messages buffered per connection before a slow client is dropped
+CONNECTION_QUEUE_SIZE = 64
+MIN_EXPOSURE = 3
+
+
+class MoveError(ValueError):
+    """Raised for a move that is not allowed in the table's current state."""
+
+
+class TablesUnavailable(Exception):
+    """Raised when this process cannot host live tables."""
+
+
+def _names(kinds) -> List[str]:
+    return [TILE_KINDS[kind] for kind in kinds]
+
+
+def _expand(counts) -> List[str]:
+    return [TILE_KINDS[kind] for kind, count in enumerate(counts) for _ in range(count)]
+
+
+class Connection:
+    """A client's outgoing message queue."""
+
+    def __init__(self, seat: Optional[int]):
+        self.seat = seat
+        # None tells the sender to close the connection
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        self.dropped = False
+
+    def push(self, message: str):
+        if self.dropped:
+            return
+        if self.queue.qsize() >= CONNECTION_QUEUE_SIZE:
+            # Too far behind: close it rather than buffer without bound
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(message)
+
+
+class GameTable:
+    """One four-player game and its connected clients."""
+
+    def __init__(self, table_id: str, seed: int, table: VariationTable):
+        self.table_id = table_id
+        self.seed = seed
+        self.table = table
+        self.template_ids = table.template_ids
+        self.wall = Wall(seed)
+        self.hands = [bytearray(NUM_TILE_KINDS) for _ in range(DEFAULT_PLAYERS)]
+        self.exposed = [bytearray(NUM_TILE_KINDS) for _ in range(DEFAULT_PLAYERS)]
+        self.discards = array('B')
+        # Count vector of the tiles lying in the discard pile
+        self.pile = bytearray(NUM_TILE_KINDS)
+        # Last distance sent to each seat, per template
+        self.distances = [bytearray([HAND_SIZE] * len(self.template_ids))
+                          for _ in range(DEFAULT_PLAYERS)]
+        self.connections: List[Connection] = []
+        self.seq = 0
+        self.turn = 0
+        self.phase = "discard"  # East starts with the extra tile
+        self.last_discard: Optional[int] = None
+        self.winner: Optional[int] = None
+        self.finished = False
+        self.last_move = time.monotonic()
+
+        for seat in range(DEFAULT_PLAYERS):
+            size = DEFAULT_HAND_SIZE + (1 if seat == 0 else 0)
+            for kind in self.wall.draw_many(size):
+                self.hands[seat][kind] += 1
+        self._analyze(range(DEFAULT_PLAYERS))
+
+    # State
+
+    def concealed(self, seat: int) -> List[int]:
+        return [total - exposed for total, exposed in zip(self.hands[seat], self.exposed[seat])]
+
+    def snapshot(self, seat: Optional[int] = None) -> dict:
+        """Full state as seen from a seat (or by a spectator)."""
+        state = {
+            "type": "snapshot",
+            "table_id": self.table_id,
+            "seq": self.seq,
+            "turn": self.turn,
+            "phase": self.phase,
+            "wall": len(self.wall),
+            "discards": _names(self.discards),
+            "exposed": [_expand(exposed) for exposed in self.exposed],
+            "concealed_counts": [sum(self.concealed(s)) for s in range(DEFAULT_PLAYERS)],
+            "finished": self.finished,
+            "winner": self.winner,
+        }
+        if seat is not None:
+            state["seat"] = seat
+            state["hand"] = _expand(self.concealed(seat))
+            state["analysis"] = dict(zip(self.template_ids, self.distances[seat]))
+        return state
+
+    # Moves
+
+    def apply(self, seat: int, move: dict):
+        """Validate and apply a move, then broadcast its delta."""
+        if self.finished:
+            raise MoveError("The game is over")
+        action = move.get("action")
+        tiles = move.get("tiles", [])
+        if not isinstance(tiles, list) or not all(isinstance(name, str) for name in tiles):
+            raise MoveError("Tiles must be a list of short names")
+        try:
+            tiles = parse_short_names(tiles)
+        except ValueError as e:
+            raise MoveError(str(e))
+
+        public: dict = {}
+        private: dict = {}
+        affected = [seat]
+        if action == "draw":
+            self._require_turn(seat, "draw")
+            if not len(self.wall):
+                self._finish(None)
+            else:
+                kind = self.wall.draw()
+                self.hands[seat][kind] += 1
+                private["drawn"] = [TILE_KINDS[kind]]
+                self.last_discard = None
+                self.phase = "discard"
+        elif action == "discard":
+            self._require_turn(seat, "discard")
+            if len(tiles) != 1 or self.concealed(seat)[tiles[0]] == 0:
+                raise MoveError("Discard one tile from the concealed hand")
+            kind = tiles[0]
+            self.hands[seat][kind] -= 1
+            self.discards.append(kind)
+            self.pile[kind] += 1
+            self.last_discard = kind
+            self.turn = (seat + 1) % DEFAULT_PLAYERS
+            self.phase = "draw"
+            public["tiles"] = [TILE_KINDS[kind]]
+            affected = range(DEFAULT_PLAYERS)
+        elif action == "call":
+            self._call(seat, tiles)
+            public["tiles"] = _names(tiles)
+            affected = range(DEFAULT_PLAYERS)
+        elif action == "mahjong":
+            self._require_turn(seat, "discard")
+            if 0 not in self.distances[seat]:
+                raise MoveError("The hand does not match any template")
+            self._finish(seat)
+            public["hand"] = _expand(self.hands[seat])
+        else:
+            raise MoveError(f"Unknown action: {action}")
+
+        self.seq += 1
+        self.last_move = time.monotonic()
+        public.update({"seq": self.seq, "seat": seat, "action": action, "turn": self.turn,
+                       "phase": self.phase, "wall": len(self.wall)})
+        if self.finished:
+            public["finished"] = True
+            public["winner"] = self.winner
+        changes = self._analyze(affected) if not self.finished else {}
+        self._broadcast(public, {seat: private} if private else {}, changes)
+
+    def _require_turn(self, seat: int, phase: str):
+        if seat != self.turn or self.phase != phase:
+            raise MoveError(f"Not seat {seat}'s turn to {phase}")
+
+    def _call(self, seat: int, tiles: List[int]):
+        discard = self.last_discard
+        if self.phase != "draw" or discard is None or seat == (self.turn - 1) % DEFAULT_PLAYERS:
+            raise MoveError("There is no discard to call")
+        if len(tiles) < MIN_EXPOSURE or discard not in tiles or \
+                any(kind not in (discard, JOKER_ID) for kind in tiles):
+            raise MoveError(f"Expose at least {MIN_EXPOSURE} tiles matching the discard")
+        from_hand = list(tiles)
+        from_hand.remove(discard)
+        concealed = self.concealed(seat)
+        for kind in from_hand:
+            if concealed[kind] == 0:
+                raise MoveError("Exposed tiles must come from the concealed hand")
+            concealed[kind] -= 1
+
+        self.discards.pop()
+        # The called tile leaves the pile for the caller's hand
+        self.pile[discard] -= 1
+        self.hands[seat][discard] += 1
+        for kind in tiles:
+            self.exposed[seat][kind] += 1
+        self.last_discard = None
+        self.turn = seat
+        self.phase = "discard"
+
+    def _finish(self, winner: Optional[int]):
+        self.finished = True
+        self.winner = winner
+
+    # Analysis and broadcast
+
+    def _analyze(self, seats) -> Dict[int, Dict[str, int]]:
+        """Recompute distances for the given seats; returns those that changed."""
+        live = {template_id: live_indices(self.table, template_id, self.pile)
+                for template_id in self.template_ids}
+        changes = {}
+        for seat in seats:
+            counts = list(self.hands[seat])
+            previous = self.distances[seat]
+            changed = {}
+            for i, template_id in enumerate(self.template_ids):
+                distance = analyze_counts(self.table, template_id, counts, variations=live[template_id]).distance
+                distance = min(distance, HAND_SIZE)
+                if distance != previous[i]:
+                    previous[i] = distance
+                    changed[template_id] = distance
+            if changed:
+                changes[seat] = changed
+        return changes
+
+    def _broadcast(self, public: dict, private: Dict[int, dict], changes: Dict[int, Dict[str, int]]):
+        encoded = {None: dumps(public).decode("utf-8")}
+        for seat in set(private) | set(changes):
+            message = dict(public, **private.get(seat, {}))
+            if seat in changes:
+                message["analysis"] = changes[seat]
+            encoded[seat] = dumps(message).decode("utf-8")
+        for connection in self.connections:
+            connection.push(encoded.get(connection.seat, encoded[None]))
+
+    def connect(self, seat: Optional[int]) -> Connection:
+        """Add a client; its first message is the snapshot for its seat."""
+        if seat is not None and not 0 <= seat < DEFAULT_PLAYERS:
+            raise MoveError(f"Seat must be 0-{DEFAULT_PLAYERS - 1}")
+        connection = Connection(seat)
+        connection.push(dumps(self.snapshot(seat)).decode("utf-8"))
+        self.connections.append(connection)
+        return connection
+
+    def disconnect(self, connection: Connection):
+        if connection in self.connections:
+            self.connections.remove(connection)
+
+
+class TableRegistry:
+    """The live tables of this process."""
+
+    def __init__(self, max_tables: int = DEFAULT_MAX_TABLES,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.max_tables = max_tables
+        self.idle_timeout = idle_timeout
+        self.tables: Dict[str, GameTable] = {}
+        self.games_finished = 0
+        # Why this process cannot host tables, if it cannot
+        self.disabled_reason: Optional[str] = None
+
+    def disable(self, reason: str):
+        """Refuse live tables from now on, e.g. when several workers serve the API."""
+        self.disabled_reason = reason
+
+    def check_available(self):
+        if self.disabled_reason is not None:
+            raise TablesUnavailable(self.disabled_reason)
+
+    def create(self, seed: Optional[int] = None) -> GameTable:
+        self.check_available()
+        self.reap()
+        if len(self.tables) >= self.max_tables:
+            raise MoveError("Too many live tables")
+        if seed is None:
+            seed = random.getrandbits(32)
+        table_id = secrets.token_urlsafe(6)
+        table = self.tables[table_id] = GameTable(table_id, seed, get_variation_table())
+        return table
+
+    def get(self, table_id: str) -> Optional[GameTable]:
+        self.check_available()
+        return self.tables.get(table_id)
+
+    def reap(self):
+        """Drop unwatched tables that are finished or have been idle too long."""
+        idle_since = time.monotonic() - self.idle_timeout
+        for table_id, table in list(self.tables.items()):
+            if table.connections:
+                continue
+            if table.finished:
+                self.games_finished += 1
+            elif table.last_move > idle_since:
+                continue
+            del self.tables[table_id]
+
+    def stats(self) -> dict:
+        return {
+            "tables": len(self.tables),
+            "max_tables": self.max_tables,
+            "connections": sum(len(t.connections) for t in self.tables.values()),
+            "games_finished": self.games_finished,
+            "disabled": self.disabled_reason,
+        }
+
+
+_registry: Optional[TableRegistry] = None
+
+
+def get_table_registry() -> TableRegistry:
+    """Get the process-wide table registry.
+
+    ``MAHJONGG_MAX_TABLES`` caps the number of tables and
+    ``MAHJONGG_TABLE_IDLE_TIMEOUT`` sets how long an unwatched table is kept.
+    """
+    global _registry
+    if _registry is None:
+        _registry = TableRegistry(
+            int(os.environ.get("MAHJONGG_MAX_TABLES", DEFAULT_MAX_TABLES)),
+            float(os.environ.get("MAHJONGG_TABLE_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT)),
+        )
+    return _registry
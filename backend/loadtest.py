@@ -0,0 +1,261 @@
+"""
+Load generator for the Mahjongg Hand Analyzer API.
+
+Drives the app either in-process (calling the ASGI app directly, no network)
+or against a running server, at each concurrency level from 1 to N, and
+reports throughput, latency percentiles and error rate per level. Analysis
+requests use East's opening hand from seeded deals over the 152-tile set, so
+the payloads follow a realistic distribution and runs are reproducible.
+
+Usage (from the backend directory):
+
+    python loadtest.py --workers 8 --duration 10
+    python loadtest.py --url http://127.0.0.1:8000 --mix analyze=90,templates=5,health=5
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from core.dealer import deal
+from core.hand_templates import list_templates
+from core.tiles import TILE_KINDS
+
+DEFAULT_MIX = "analyze=80,templates=15,health=5"
+
+# (method, path, body)
+Request = Tuple[str, str, bytes]
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse a traffic mix such as ``analyze=80,templates=15,health=5``."""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("analyze", "templates", "health"):
+            raise ValueError(f"Unknown request kind in mix: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class TrafficMix:
+    """Draws requests according to a traffic mix."""
+
+    def __init__(self, mix: Dict[str, float], seed: int = 0, hand_pool: int = 1000):
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.rng = random.Random(seed)
+        self.template_ids = [t.template_id for t in list_templates()]
+        # East's opening hand (14 tiles) from consecutive seeded deals
+        self.hands = [
+            json.dumps([{"short_name": TILE_KINDS[kind]} for kind in deal(seed + i).hands[0]]).encode()
+            for i in range(hand_pool)
+        ]
+
+    def next(self) -> Request:
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        if kind == "analyze":
+            template_id = self.rng.choice(self.template_ids)
+            return "POST", f"/analyze/{template_id}", self.rng.choice(self.hands)
+        if kind == "templates":
+            template_id = self.rng.choice(self.template_ids)
+            path = self.rng.choice(["/templates", f"/templates/{template_id}",
+                                    f"/templates/{template_id}/variations"])
+            return "GET", path, b""
+        return "GET", "/health", b""
+
+
+@dataclass
+class LevelResult:
+    """Measurements for one concurrency level."""
+    workers: int
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: Dict[int, int] = field(default_factory=dict)
+
+    def record(self, status: int, latency: float):
+        self.latencies.append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not 200 <= status < 400:
+            self.errors += 1
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    def summary(self) -> dict:
+        count = len(self.latencies)
+        return {
+            "workers": self.workers,
+            "requests": count,
+            "throughput_rps": round(count / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": round(self.percentile(0.50), 2),
+            "p95_ms": round(self.percentile(0.95), 2),
+            "p99_ms": round(self.percentile(0.99), 2),
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "statuses": self.statuses,
+        }
+
+
+async def asgi_request(app, method: str, target: str, body: bytes = b"") -> int:
+    """Send one request straight to an ASGI app and return the status code."""
+    path, _, query = target.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [
+            (b"host", b"loadtest"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("loadtest", 80),
+    }
+    status = 0
+    done = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body", False):
+            done.set()
+
+    await app(scope, receive, send)
+    done.set()
+    return status
+
+
+async def _run_in_process(app, mix: TrafficMix, workers: int, duration: float) -> LevelResult:
+    result = LevelResult(workers=workers)
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            method, path, body = mix.next()
+            started = time.perf_counter()
+            try:
+                status = await asgi_request(app, method, path, body)
+            except Exception:
+                status = 599
+            result.record(status, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def _run_remote(url: str, mix: TrafficMix, workers: int, duration: float) -> LevelResult:
+    result = LevelResult(workers=workers)
+    target = urlsplit(url)
+    deadline = time.perf_counter() + duration
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+        while time.perf_counter() < deadline:
+            with lock:
+                method, path, body = mix.next()
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body or None,
+                             headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = 599
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+            with lock:
+                result.record(status, time.perf_counter() - started)
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def run_load_test(workers: int = 4, duration: float = 5.0, mix: str = DEFAULT_MIX,
+                  url: Optional[str] = None, seed: int = 0) -> List[dict]:
+    """
+    Run the load test at every concurrency level from 1 to ``workers``.
+
+    Args:
+        workers: Highest number of concurrent clients
+        duration: Seconds to run each level
+        mix: Traffic mix across analyze, templates and health requests
+        url: Base URL of a running server; the app is driven in-process if omitted
+        seed: Seed for the request sequence and dealt hands
+    """
+    traffic = TrafficMix(parse_mix(mix), seed=seed)
+    results = []
+    if url is None:
+        import main
+
+        async def run_levels():
+            await main.load_variation_table()
+            return [await _run_in_process(main.app, traffic, level, duration)
+                    for level in range(1, workers + 1)]
+
+        results = asyncio.run(run_levels())
+    else:
+        results = [_run_remote(url, traffic, level, duration) for level in range(1, workers + 1)]
+    return [result.summary() for result in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Mahjongg Hand Analyzer API")
+    parser.add_argument("--url", help="Base URL of a running server (default: drive the app in-process)")
+    parser.add_argument("--workers", type=int, default=4, help="Highest concurrency level to test")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per concurrency level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Traffic mix, e.g. analyze=80,templates=15,health=5")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for requests and dealt hands")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    summaries = run_load_test(args.workers, args.duration, args.mix, args.url, args.seed)
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+        return
+
+    print(f"{'workers':>7} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for s in summaries:
+        print(f"{s['workers']:>7} {s['requests']:>9} {s['throughput_rps']:>9} {s['p50_ms']:>8} "
+              f"{s['p95_ms']:>8} {s['p99_ms']:>8} {s['error_rate']:>7.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,33 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from pydantic import BaseModel
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
+import asyncio
+import json
+from math import comb
+from dataclasses import asdict
 import textwrap
+import time
 import traceback
 
-from core.tiles import Tile, create_tile_from_short_name
+from core.tiles import (
+    TILE_KINDS, Tile, create_tile_from_short_name, ids_to_counts, parse_short_names
+)
 from core.hand_templates import HandTemplate, get_template, list_templates
+from core.variation_table import estimate_size, get_variation_table, record_short_names
+from core.analyzer import HAND_SIZE, analyze_counts
+from core.pruning import prune
+from core.search import SearchQuery, TileGroup, get_search_index
+from core.catalog import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, get_catalog
+from core.result_cache import analyze_cached, get_analysis_cache
+from core.difficulty import TOTAL_TILES, get_difficulty_table
+from core.variation_pool import get_variation_pool
+from core.wait_table import get_wait_table
+from core.dealer import DEFAULT_HAND_SIZE, DEFAULT_PLAYERS, FULL_SET, deal, iter_deals
+from profiling import RequestProfiler
+from admission import AdmissionMiddleware, render_metrics
+from live_tables import MoveError, TablesUnavailable, get_table_registry
 
 # Create FastAPI app
 app = FastAPI(
@@ -16,6 +36,11 @@ app = FastAPI(
     version="0.1.0"
 )
 
+# Per-route concurrency limits and wait queues for expensive endpoints
+# (see admission.py for configuration). Added before CORS so that CORS wraps
+# it and its 503 responses stay readable by cross-origin front ends.
+app.add_middleware(AdmissionMiddleware)
+
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -23,8 +48,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After", "X-Table-Version"],
 )
 
+# Opt-in request profiling (see profiling.py for configuration)
+profiler = RequestProfiler.from_env()
+
+async def profile_requests(request: Request, call_next):
+    """Profile sampled requests and requests carrying the debug header."""
+    if request.url.path.startswith("/admin/") or not profiler.should_profile(request.headers):
+        return await call_next(request)
+    
+    profile = profiler.start()
+    if profile is None:
+        # Another request is already being profiled
+        return await call_next(request)
+    
+    started = time.time()
+    try:
+        response = await call_next(request)
+    finally:
+        record = profiler.finish(profile, request.method, request.url.path, started)
+    response.headers["X-Profile-Id"] = str(record.profile_id)
+    return response
+
+# Only installed when profiling is configured, so requests pay nothing otherwise
+if profiler.enabled:
+    app.middleware("http")(profile_requests)
+
 # Request/Response models
 class TileModel(BaseModel):
     short_name: str
@@ -36,6 +87,26 @@ class HandTemplateModel(BaseModel):
     category: str
     point_value: int
 
+class LiveAnalysisRequest(BaseModel):
+    hand: List[str] = []
+    visible: List[str] = []
+
+class WaitRequest(BaseModel):
+    hand: List[str]
+
+class CreateTableRequest(BaseModel):
+    seed: Optional[int] = Field(None, ge=0)
+
+class TileGroupModel(BaseModel):
+    tiles: List[str]
+    min_count: int = Field(1, ge=1, le=8)
+
+class SearchRequest(BaseModel):
+    tiles: List[str] = []
+    min_overlap: int = Field(0, ge=0)
+    groups: List[TileGroupModel] = []
+    limit: int = Field(50, ge=1, le=1000)
+
 class HandAnalysisResult(BaseModel):
     template: HandTemplateModel
     is_match: bool
@@ -281,6 +352,34 @@ async def get_template_variations(template_id: str):
         """
     )
 
+@app.post("/analyze")
+async def analyze_hand_all(tiles: List[TileModel]):
+    """
+    Analyze a hand against every template at once.
+    
+    Each distinct variation is matched once, however many templates share it.
+    Results are sorted by distance, closest first.
+    """
+    counts = _parse_counts([tile.short_name for tile in tiles])
+    table = get_variation_table()
+    analyses = get_variation_pool(table).analyze_all(counts)
+    results = sorted(analyses.values(), key=lambda analysis: analysis.distance)
+    return {
+        "tile_count": sum(counts),
+        "best": results[0].template_id if results else None,
+        "results": [
+            {
+                "template_id": analysis.template_id,
+                "is_match": analysis.is_match,
+                "distance": analysis.distance,
+                "closest_variation": analysis.variation,
+                "jokers": analysis.jokers
+            }
+            for analysis in results
+        ],
+        "table_version": table.version
+    }
+
 @app.post("/analyze/{template_id}", response_model=HandAnalysisResult)
 async def analyze_hand(template_id: str, tiles: List[TileModel]):
     """
@@ -295,28 +394,501 @@ async def analyze_hand(template_id: str, tiles: List[TileModel]):
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     
-    # Convert short names to Tile objects
+    # Convert short names to compact tile ids in a single pass
+    short_names = [tile.short_name for tile in tiles]
     try:
-        tile_objects = [create_tile_from_short_name(tile.short_name) for tile in tiles]
+        tile_ids = parse_short_names(short_names)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
-    # Check if the hand matches the template
-    is_match = template.validate_hand(tile_objects)
+    # Match against the compiled variations; fall back to the template's own
+    # validation if the loaded table predates the template
+    table = get_variation_table()
+    if template_id not in table:
+        tile_objects = [create_tile_from_short_name(name) for name in short_names]
+        is_match = template.validate_hand(tile_objects)
+        return HandAnalysisResult(
+            template=HandTemplateModel.model_validate(template, from_attributes=True),
+            is_match=is_match,
+            score=1.0 if is_match else 0.0,
+            details={
+                "message": "Analysis complete",
+                "tile_count": len(tile_objects)
+            }
+        )
     
-    # In a real implementation, calculate a more detailed score
-    score = 1.0 if is_match else 0.0
+    analysis = analyze_cached(table, template_id, ids_to_counts(tile_ids), get_analysis_cache())
     
     return HandAnalysisResult(
-        template=template,
-        is_match=is_match,
-        score=score,
+        template=HandTemplateModel.model_validate(template, from_attributes=True),
+        is_match=analysis.is_match,
+        score=max(0.0, 1.0 - analysis.distance / HAND_SIZE),
         details={
             "message": "Analysis complete",
-            "tile_count": len(tile_objects)
+            "tile_count": len(tile_ids),
+            "distance": analysis.distance,
+            "closest_variation": analysis.variation,
+            "jokers": analysis.jokers,
+            "table_version": table.version
         }
     )
 
+@app.on_event("startup")
+async def load_variation_table():
+    """Compile or map the variation table and encode the catalog before serving requests."""
+    get_variation_table()
+    get_wait_table()
+    get_catalog()
+
+def _cached_json(request: Request, body: bytes, etag: str) -> Response:
+    """Serve a pre-encoded JSON body, answering 304 when the client's copy is current."""
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/templates")
+async def api_list_templates(request: Request):
+    """List all hand templates as JSON."""
+    catalog = get_catalog()
+    return _cached_json(request, catalog.templates_body, f'"{catalog.version}"')
+
+@app.get("/api/templates/{template_id}")
+async def api_get_template(template_id: str, request: Request):
+    """Get a single hand template as JSON."""
+    catalog = get_catalog()
+    if template_id not in catalog:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return _cached_json(request, catalog.template_body(template_id),
+                        f'"{catalog.version}-{template_id}"')
+
+@app.get("/api/templates/{template_id}/variations")
+async def api_get_template_variations(
+    template_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    Get a page of a template's variations as JSON.
+    
+    Each variation is a compact string of its tile sets, e.g.
+    "2x1B 3x3B 4x5C 3x7D 2x9D".
+    """
+    catalog = get_catalog()
+    if template_id not in catalog:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return _cached_json(request, catalog.variations_page(template_id, offset, limit),
+                        f'"{catalog.version}-{template_id}-{offset}-{limit}"')
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip, honouring q-values (``gzip;q=0``)."""
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    # An explicit gzip entry wins over the wildcard
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+@app.get("/api/variation-table")
+async def api_variation_table(request: Request, v: Optional[str] = None):
+    """
+    Download the compiled variation table for client-side matching.
+    
+    The body is the binary table format described in core/variation_table.py
+    (decoder: shared/js/variation-table.js), gzip-compressed when the client
+    accepts it. Requests pinned to the current version with ``?v=<version>``
+    may be cached forever.
+    """
+    table = get_variation_table()
+    gzip = _accepts_gzip(request.headers.get("accept-encoding", ""))
+    # The two encodings are different bytes, so each gets its own strong ETag
+    etag = f'"{table.version}-gzip"' if gzip else f'"{table.version}"'
+    if v == table.version:
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = "public, max-age=60"
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+        "X-Table-Version": table.version,
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=table.compressed(), media_type="application/octet-stream",
+                        headers=headers)
+    return Response(content=table.to_bytes(), media_type="application/octet-stream",
+                    headers=headers)
+
+@app.get("/api/difficulty")
+async def api_difficulty(
+    k: int = Query(3, ge=0, le=HAND_SIZE),
+    hand_size: int = Query(DEFAULT_HAND_SIZE, ge=1, le=HAND_SIZE)
+):
+    """
+    Exact odds of being dealt a hand within k tiles of each template.
+    
+    Templates are ranked by the easiest of their variations, for comparison
+    with their point values. Deal counts are exact integers, sent as strings
+    since they exceed what JSON numbers hold precisely.
+    """
+    table = get_variation_table()
+    difficulty = get_difficulty_table(table, hand_size)
+    templates = []
+    for template_id, variations in difficulty.variations.items():
+        template = get_template(template_id)
+        easiest = difficulty.easiest(template_id, k)
+        templates.append({
+            "template_id": template_id,
+            "name": template.name if template else None,
+            "point_value": template.point_value if template else None,
+            "easiest_variation": easiest.variation_index if easiest else None,
+            "probability": easiest.probability_within(k) if easiest else 0.0,
+            "variations": [
+                {"index": v.variation_index, "deals": str(v.within(k)),
+                 "probability": v.probability_within(k)}
+                for v in variations
+            ]
+        })
+    templates.sort(key=lambda t: t["probability"], reverse=True)
+    return {
+        "k": k,
+        "hand_size": hand_size,
+        "total_deals": str(comb(TOTAL_TILES, hand_size)),
+        "table_version": table.version,
+        "templates": templates
+    }
+
+def _parse_counts(short_names: List[str]) -> List[int]:
+    """Parse short names into a count vector, rejecting bad payloads with 400."""
+    try:
+        return ids_to_counts(parse_short_names(short_names))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/live-variations")
+async def live_variations(request: LiveAnalysisRequest):
+    """
+    List the variations of every template that are still achievable.
+    
+    Args:
+        request: Tiles visible to the player (discards and exposures); the
+            hand is ignored
+    """
+    live = prune(get_variation_table(), _parse_counts(request.visible))
+    return live.summary()
+
+def _visible_to_player(hand: List[int], visible: List[int]) -> List[int]:
+    """Visible tiles that are not in the player's own hand, e.g. their exposures.
+
+    The player still holds their own exposed tiles, so those must not prune
+    the player's analysis. Visible tiles of a kind up to the number the hand
+    holds are taken to be the player's own; since each list is already within
+    the set's copies, the hand and the remaining visible tiles together are too.
+    """
+    return [max(0, seen - held) for held, seen in zip(hand, visible)]
+
+@app.post("/analyze/{template_id}/live", response_model=HandAnalysisResult)
+async def analyze_hand_live(template_id: str, request: LiveAnalysisRequest):
+    """
+    Analyze a hand against only the variations the visible tiles leave achievable.
+    
+    Args:
+        request: The player's hand (concealed and exposed tiles) and every
+            visible tile (discards and all exposures, the player's own included)
+    """
+    template = get_template(template_id)
+    table = get_variation_table()
+    if not template or template_id not in table:
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    counts = _parse_counts(request.hand)
+    visible = _visible_to_player(counts, _parse_counts(request.visible))
+    live = prune(table, visible).live(template_id)
+    analysis = analyze_counts(table, template_id, counts, variations=live)
+    
+    return HandAnalysisResult(
+        template=HandTemplateModel.model_validate(template, from_attributes=True),
+        is_match=analysis.is_match,
+        score=max(0.0, 1.0 - analysis.distance / HAND_SIZE),
+        details={
+            "message": "Analysis complete",
+            "tile_count": sum(counts),
+            "distance": analysis.distance,
+            "closest_variation": analysis.variation,
+            "jokers": analysis.jokers,
+            "live_variations": len(live),
+            "total_variations": table.variation_count(template_id),
+            "table_version": table.version
+        }
+    )
+
+@app.post("/search")
+async def search_variations(request: SearchRequest):
+    """
+    Search every template variation by the tiles it uses.
+    
+    Examples:
+        {"tiles": ["1B", "2B", "3B", "4B"], "min_overlap": 3}
+            hands that use 3 or more of these tiles
+        {"groups": [{"tiles": ["5B", "5C", "5D"], "min_count": 4}, {"tiles": ["FL"]}]}
+            hands containing a kong of 5s and any flowers
+    """
+    if not request.tiles and not request.groups:
+        raise HTTPException(status_code=400, detail="Query needs tiles or groups")
+    try:
+        query = SearchQuery(
+            tiles=parse_short_names(request.tiles),
+            min_overlap=request.min_overlap,
+            groups=[TileGroup(tiles=parse_short_names(g.tiles), min_count=g.min_count)
+                    for g in request.groups],
+            limit=request.limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    result = get_search_index(get_variation_table()).search(query)
+    templates = []
+    for template_id, count in result.template_matches.items():
+        template = get_template(template_id)
+        templates.append({
+            "template_id": template_id,
+            "name": template.name if template else None,
+            "matches": count
+        })
+    
+    return {
+        "total": result.total,
+        "templates": templates,
+        "variations": [asdict(hit) for hit in result.hits]
+    }
+
+@app.post("/waits")
+async def winning_tiles(request: WaitRequest):
+    """
+    List the tiles that would complete a 13-tile hand, per template.
+    
+    Answered with a single lookup in the precomputed wait table, which also
+    indexes hands holding jokers.
+    """
+    counts = _parse_counts(request.hand)
+    if sum(counts) != HAND_SIZE - 1:
+        raise HTTPException(status_code=400, detail=f"A waiting hand has {HAND_SIZE - 1} tiles")
+    
+    waits = get_wait_table().lookup(counts)
+    tiles = sorted({tile for wait in waits.values() for tile in wait}, key=TILE_KINDS.index)
+    return {
+        "waiting": bool(waits),
+        "tiles": tiles,
+        "templates": [{"template_id": template_id, "tiles": wait} for template_id, wait in waits.items()],
+        "table_version": get_variation_table().version
+    }
+
+def _check_deal_size(players: int, hand_size: int):
+    """Reject deals that need more tiles than the set holds."""
+    if players * hand_size + 1 > len(FULL_SET):
+        raise HTTPException(status_code=400, detail="Not enough tiles for this many players and tiles")
+
+@app.get("/deals/{seed}")
+async def get_deal(
+    seed: int,
+    players: int = Query(DEFAULT_PLAYERS, ge=1, le=8),
+    hand_size: int = Query(DEFAULT_HAND_SIZE, ge=1, le=20)
+):
+    """Deal the opening hands for a single seed."""
+    _check_deal_size(players, hand_size)
+    return deal(seed, players=players, hand_size=hand_size).to_dict()
+
+@app.get("/deals")
+async def stream_deals(
+    seed_start: int = Query(0, ge=0),
+    count: int = Query(1000, ge=1, le=10_000_000),
+    players: int = Query(DEFAULT_PLAYERS, ge=1, le=8),
+    hand_size: int = Query(DEFAULT_HAND_SIZE, ge=1, le=20)
+):
+    """
+    Stream reproducible deals for a range of seeds as newline-delimited JSON.
+    
+    Args:
+        seed_start: First seed of the range
+        count: Number of consecutive seeds to deal
+        players: Seats per deal
+        hand_size: Tiles per seat (East gets one extra)
+    """
+    _check_deal_size(players, hand_size)
+    
+    def generate():
+        batch = []
+        for dealt in iter_deals(seed_start, count, players=players, hand_size=hand_size):
+            batch.append(json.dumps(dealt.to_dict(), separators=(",", ":")))
+            if len(batch) == 500:
+                yield "\n".join(batch) + "\n"
+                batch = []
+        if batch:
+            yield "\n".join(batch) + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.post("/tables")
+async def create_table(request: CreateTableRequest):
+    """Open a live four-player table; join it at /tables/{table_id}/ws?seat=N."""
+    try:
+        table = get_table_registry().create(request.seed)
+    except (MoveError, TablesUnavailable) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"table_id": table.table_id, "seed": table.seed}
+
+@app.get("/tables/{table_id}")
+async def get_table_state(table_id: str):
+    """Public state of a live table."""
+    try:
+        table = get_table_registry().get(table_id)
+    except TablesUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if table is None:
+        raise HTTPException(status_code=404, detail="Table not found")
+    return table.snapshot()
+
+@app.websocket("/tables/{table_id}/ws")
+async def table_socket(websocket: WebSocket, table_id: str, seat: Optional[int] = None):
+    """
+    Follow a live table, and play a seat if one is given.
+    
+    The first message is a snapshot; every move is followed by a delta (see
+    live_tables.py). Seated clients send their moves on the same socket.
+    """
+    registry = get_table_registry()
+    try:
+        table = registry.get(table_id)
+    except TablesUnavailable:
+        await websocket.close(code=4503)
+        return
+    if table is None:
+        await websocket.close(code=4404)
+        return
+    try:
+        connection = table.connect(seat)
+    except MoveError:
+        await websocket.close(code=4400)
+        return
+    await websocket.accept()
+
+    async def send_messages():
+        while True:
+            message = await connection.queue.get()
+            if message is None:
+                await websocket.close(code=4408)
+                return
+            await websocket.send_text(message)
+
+    # Everything sent to the client goes through its queue, in order
+    sender = asyncio.create_task(send_messages())
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                if seat is None:
+                    raise MoveError("Spectators cannot move")
+                move = json.loads(text)
+                if not isinstance(move, dict):
+                    raise MoveError("A move is a JSON object")
+                table.apply(seat, move)
+            except ValueError as e:
+                connection.push(json.dumps({"error": str(e)}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        table.disconnect(connection)
+        registry.reap()
+
+@app.get("/admin/tables")
+async def live_table_stats():
+    """Number of live tables and connected clients."""
+    return get_table_registry().stats()
+
+@app.get("/admin/cache")
+async def analysis_cache_stats():
+    """Hit/miss counters of the analysis result cache."""
+    return get_analysis_cache().stats()
+
+@app.get("/admin/memory")
+async def table_memory():
+    """Memory used by the variation table, its indexes and lookups, the wait table and the catalog."""
+    table = get_variation_table()
+    report = table.memory_report()
+    report["variation_pool"] = get_variation_pool(table).stats()
+    report["wait_table"] = get_wait_table().memory_report()
+    # Pre-encoded bodies; pages cached on demand are not included
+    report["catalog_bytes"] = estimate_size(get_catalog())
+    return report
+
+@app.get("/admin/variation-pool")
+async def variation_pool_references(shared: bool = False):
+    """Every distinct variation record and the template variations using it.
+
+    With ``shared=true`` only records used by more than one variation are listed.
+    """
+    table = get_variation_table()
+    pool = get_variation_pool(table)
+    records = []
+    for position, refs in enumerate(pool.refs):
+        if shared and len(refs) < 2:
+            continue
+        template_position, index = refs[0]
+        need, _natural = table.record(pool.template_ids[template_position], index)
+        records.append({
+            "position": position,
+            "tiles": record_short_names(need),
+            "uses": pool.references(position),
+        })
+    return {"stats": pool.stats(), "records": records}
+
+@app.get("/admin/profiles")
+async def list_profiles():
+    """List the stored request profiles."""
+    return {
+        "enabled": profiler.enabled,
+        "sample_every": profiler.sample_every,
+        "profiles": [record.summary() for record in profiler.profiles]
+    }
+
+@app.get("/admin/profiles/flamegraph", response_class=PlainTextResponse)
+async def profiles_flamegraph(path: Optional[str] = None):
+    """Collapsed stacks aggregated over the stored profiles, for flame graph tools."""
+    return profiler.flamegraph(path)
+
+@app.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: int):
+    """Download a stored profile as a pstats file."""
+    record = profiler.get(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(
+        content=record.dump(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.prof"'}
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Admission control metrics in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -324,5 +896,6 @@ async def health_check():
     return {"status": "healthy"}
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Single process unless --workers or $MAHJONGG_WORKERS asks for more; see serve.py
+    import serve
+    serve.main(app=app)
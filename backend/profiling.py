@@ -0,0 +1,171 @@
+"""
+Opt-in request profiling for the API server.
+
+A sampled request runs under ``cProfile`` from the moment the middleware sees
+it until its response is ready, so the profile covers request parsing, tile
+parsing, template lookup and analysis. The most recent profiles are kept in
+memory and served through the admin endpoints as ``pstats`` files (open them
+with ``python -m pstats`` or snakeviz) and as aggregated collapsed stacks for
+flame graph tools.
+
+Configuration (environment):
+    MAHJONGG_PROFILE_SAMPLE   Profile 1 in N requests (unset or 0: never)
+    MAHJONGG_PROFILE_TOKEN    Profile requests whose X-Debug-Profile header
+                              carries this token (unset: header ignored)
+    MAHJONGG_PROFILE_KEEP     Number of profiles kept in memory (default 50)
+
+cProfile traces the whole event loop thread, so work from other requests that
+interleaves with a profiled one shows up in its profile too.
+"""
+import cProfile
+import itertools
+import marshal
+import os
+import pstats
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+PROFILE_HEADER = "X-Debug-Profile"
+
+# Deepest call stack emitted for flame graphs
+MAX_STACK_DEPTH = 64
+
+
+@dataclass
+class ProfileRecord:
+    """A captured request profile."""
+    profile_id: int
+    method: str
+    path: str
+    started: float
+    duration_ms: float
+    stats: dict  # pstats-format stats table
+
+    def summary(self) -> dict:
+        return {
+            "profile_id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "started": self.started,
+            "duration_ms": round(self.duration_ms, 3),
+        }
+
+    def dump(self) -> bytes:
+        """The profile in the format written by ``pstats.Stats.dump_stats``."""
+        return marshal.dumps(self.stats)
+
+
+def _function_label(func: Tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{line}:{name}"
+
+
+def collapse_stacks(stats: dict) -> Counter:
+    """
+    Convert a pstats table into collapsed stacks (microseconds of self time).
+
+    cProfile only records caller/callee edges, so each function's self time
+    is split between its call paths in proportion to the time spent along
+    each edge.
+    """
+    children: Dict[tuple, List[Tuple[tuple, float]]] = {}
+    roots = []
+    for func, (_cc, _nc, _tt, ct, callers) in stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((func, edge[3]))
+
+    folded: Counter = Counter()
+
+    def walk(func, share: float, stack: List[str], on_stack: set):
+        _cc, _nc, tt, ct, _callers = stats[func]
+        stack.append(_function_label(func))
+        self_us = tt * share * 1e6
+        if self_us >= 1:
+            folded[";".join(stack)] += int(self_us)
+        if len(stack) < MAX_STACK_DEPTH:
+            on_stack.add(func)
+            for child, edge_ct in children.get(func, ()):
+                child_ct = stats[child][3]
+                if child not in on_stack and child_ct > 0 and edge_ct * share > 0:
+                    walk(child, min(1.0, edge_ct * share / child_ct), stack, on_stack)
+            on_stack.discard(func)
+        stack.pop()
+
+    for root in roots:
+        walk(root, 1.0, [], set())
+    return folded
+
+
+class RequestProfiler:
+    """Decides which requests to profile and keeps the results."""
+
+    def __init__(self, sample_every: int = 0, token: Optional[str] = None, keep: int = 50):
+        self.sample_every = sample_every
+        self.token = token
+        self.profiles: Deque[ProfileRecord] = deque(maxlen=keep)
+        self._requests = itertools.count(1)
+        self._ids = itertools.count(1)
+        self._active = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RequestProfiler":
+        return cls(
+            sample_every=int(os.environ.get("MAHJONGG_PROFILE_SAMPLE", 0)),
+            token=os.environ.get("MAHJONGG_PROFILE_TOKEN") or None,
+            keep=int(os.environ.get("MAHJONGG_PROFILE_KEEP", 50)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_every > 0 or self.token is not None
+
+    def should_profile(self, headers) -> bool:
+        """Whether a request with these headers should be profiled."""
+        if self.token is not None and headers.get(PROFILE_HEADER) == self.token:
+            return True
+        return self.sample_every > 0 and next(self._requests) % self.sample_every == 0
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """Start a profile, unless another request is being profiled."""
+        if not self._active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile: cProfile.Profile, method: str, path: str,
+               started: float) -> ProfileRecord:
+        """Stop a profile and store it."""
+        profile.disable()
+        self._active.release()
+        record = ProfileRecord(
+            profile_id=next(self._ids),
+            method=method,
+            path=path,
+            started=started,
+            duration_ms=(time.time() - started) * 1000,
+            stats=pstats.Stats(profile).stats,
+        )
+        self.profiles.append(record)
+        return record
+
+    def get(self, profile_id: int) -> Optional[ProfileRecord]:
+        for record in self.profiles:
+            if record.profile_id == profile_id:
+                return record
+        return None
+
+    def flamegraph(self, path: Optional[str] = None) -> str:
+        """Collapsed stacks aggregated over the stored profiles."""
+        folded: Counter = Counter()
+        for record in list(self.profiles):
+            if path is None or record.path == path:
+                folded.update(collapse_stacks(record.stats))
+        return "".join(f"{stack} {micros}\n" for stack, micros in sorted(folded.items()))
@@ -0,0 +1,233 @@
+"""
+Preforked multi-worker server.
+
+The parent process compiles the variation table and builds every index and
+pre-encoded body once, moves them out of the garbage collector's tracking
+with ``gc.freeze()`` and then forks the workers. Each worker runs its own
+uvicorn server on the shared listening socket and reads the parent's objects
+through copy-on-write pages, so startup time and table memory do not grow
+with the worker count.
+
+The parent supervises the workers:
+
+    SIGHUP           rolling restart: replace workers one at a time, starting
+                     each replacement before stopping the worker it replaces
+    SIGTERM/SIGINT   stop every worker gracefully and exit
+
+Workers that die unexpectedly are replaced.
+
+State that changes while serving is per worker and is not shared: each
+worker has its own analysis cache, its own live game tables and its own
+stored request profiles. The request profiler is created when ``main`` is
+imported in the parent, so every worker starts from a copy of it and keeps
+the profiles of the requests it served itself; an ``X-Profile-Id`` can only
+be downloaded from the worker that handled the request. Live tables are
+refused when more than one worker is running (see live_tables.py).
+
+Serving defaults to a single process; preforking is opt-in with
+``--workers`` or ``MAHJONGG_WORKERS``.
+
+Usage (from the backend directory):
+
+    python -m serve --workers 4 --port 8000
+    python main.py --workers 4
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+DEFAULT_HOST = "0.0.0.0"
+DEFAULT_PORT = 8000
+# Seconds a worker gets to finish in-flight requests before it is killed
+DEFAULT_GRACEFUL_TIMEOUT = 30.0
+
+# Environment variable setting the default worker count
+WORKERS_ENV = "MAHJONGG_WORKERS"
+
+
+def warm_shared_state():
+    """Build everything read-only that workers would otherwise build themselves."""
+    from core.catalog import get_catalog
+    from core.dealer import DEFAULT_HAND_SIZE
+    from core.difficulty import get_difficulty_table
+    from core.pruning import get_dependency_index
+    from core.search import get_search_index
+    from core.variation_pool import get_variation_pool
+    from core.variation_table import get_variation_table
+    from core.wait_table import get_wait_table
+
+    table = get_variation_table()
+    for template_id in table.template_ids:
+        table.packed_records(template_id)
+        table.is_suit_symmetric(template_id)
+    get_variation_pool(table)
+    get_wait_table()
+    get_dependency_index(table)
+    get_search_index(table)
+    get_difficulty_table(table, DEFAULT_HAND_SIZE)
+    get_catalog()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """Forks uvicorn workers on a shared socket and keeps the configured number alive."""
+
+    def __init__(self, app, sock: socket.socket, workers: int,
+                 graceful_timeout: float = DEFAULT_GRACEFUL_TIMEOUT, log_level: str = "info"):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.log_level = log_level
+        self.pids: Dict[int, int] = {}  # pid -> worker number
+        self._restart_requested = False
+        self._stopping = False
+
+    def _spawn(self, number: int) -> int:
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker()
+        self.pids[pid] = number
+        return pid
+
+    def _run_worker(self):
+        # Undo the parent's handlers; uvicorn installs its own for SIGTERM/SIGINT
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        config = uvicorn.Config(self.app, log_level=self.log_level,
+                                timeout_graceful_shutdown=self.graceful_timeout)
+        status = 0
+        try:
+            uvicorn.Server(config).run(sockets=[self.sock])
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+
+    def _stop(self, pid: int):
+        """Ask a worker to finish its requests and exit; kill it after the timeout."""
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while time.monotonic() < deadline:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+            if done:
+                break
+            time.sleep(0.1)
+        else:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.pids.pop(pid, None)
+
+    def rolling_restart(self):
+        for pid, number in list(self.pids.items()):
+            if self._stopping:
+                return
+            self._spawn(number)
+            self._stop(pid)
+
+    def _reap(self):
+        """Replace workers that exited on their own."""
+        while self.pids:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            number = self.pids.pop(pid, None)
+            if number is not None and not self._stopping:
+                print(f"Worker {number} (pid {pid}) exited, restarting", file=sys.stderr)
+                self._spawn(number)
+
+    def run(self):
+        def request_restart(signum, frame):
+            self._restart_requested = True
+
+        def request_stop(signum, frame):
+            self._stopping = True
+
+        signal.signal(signal.SIGHUP, request_restart)
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        for number in range(self.workers):
+            self._spawn(number)
+        print(f"Serving with {self.workers} worker(s), parent pid {os.getpid()}", file=sys.stderr)
+
+        while not self._stopping:
+            if self._restart_requested:
+                self._restart_requested = False
+                self.rolling_restart()
+            self._reap()
+            time.sleep(0.5)
+
+        for pid in list(self.pids):
+            os.kill(pid, signal.SIGTERM)
+        for pid in list(self.pids):
+            self._stop(pid)
+
+
+def serve(app, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: int = 1,
+          graceful_timeout: float = DEFAULT_GRACEFUL_TIMEOUT, log_level: str = "info"):
+    """Warm shared state, then serve ``app`` in-process or from forked workers."""
+    warm_shared_state()
+    if workers <= 1:
+        uvicorn.run(app, host=host, port=port, log_level=log_level,
+                    timeout_graceful_shutdown=graceful_timeout)
+        return
+
+    # Live tables are per process and would be split across the workers
+    from live_tables import get_table_registry
+    reason = f"Live tables need a single-worker server; this one runs {workers} workers"
+    get_table_registry().disable(reason)
+    print(f"{reason}: live table endpoints are disabled", file=sys.stderr)
+
+    sock = bind_socket(host, port)
+    # Everything allocated so far stays untouched by collections, so the
+    # workers' copy-on-write pages are not dirtied by reference bookkeeping
+    gc.collect()
+    gc.freeze()
+    try:
+        Supervisor(app, sock, workers, graceful_timeout, log_level).run()
+    finally:
+        sock.close()
+
+
+def main(argv: Optional[List[str]] = None, app=None):
+    parser = argparse.ArgumentParser(description="Serve the Mahjongg hand analyzer API")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int,
+                        default=int(os.environ.get(WORKERS_ENV, 1)),
+                        help=f"Worker processes (default: ${WORKERS_ENV} or 1)")
+    parser.add_argument("--graceful-timeout", type=float, default=DEFAULT_GRACEFUL_TIMEOUT,
+                        help="Seconds a stopping worker gets to finish its requests")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    if app is None:
+        from main import app
+    serve(app, args.host, args.port, args.workers, args.graceful_timeout, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
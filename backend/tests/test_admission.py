@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_rejections_carry_cors_headers():
+    # Limits are read when the app is built, so use a fresh interpreter
+    script = textwrap.dedent("""
+        from fastapi.testclient import TestClient
+        import main
+        response = TestClient(main.app).get("/deals", headers={"Origin": "http://example.com"})
+        print(response.status_code)
+        print(response.headers.get("access-control-allow-origin"))
+        print(response.headers.get("access-control-expose-headers"))
+        print(response.headers.get("retry-after"))
+    """)
+    env = dict(os.environ, MAHJONGG_ADMISSION_DEALS="0,0,0.1")
+    output = subprocess.run([sys.executable, "-c", script], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, check=True).stdout.split("\n")
+    status, allow_origin, exposed, retry_after = output[:4]
+    assert status == "503"
+    assert allow_origin in ("*", "http://example.com")
+    assert "Retry-After" in exposed
+    assert int(retry_after) >= 1
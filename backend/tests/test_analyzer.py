@@ -0,0 +1,130 @@
+import itertools
+import random
+
+import pytest
+
+from core.analyzer import analyze_counts, joker_assignment, pack_counts, packed_deficit, packed_distance
+from core.hand_templates import HandTemplate
+from core.tiles import JOKER_ID, NUM_TILE_KINDS, TILE_IDS, NumberedTile, Suit, WindDirection, WindTile
+from core.tilesets import create_chow, create_pung, create_sequence, create_single
+from core.variation_table import build_variation_table, is_natural_set
+
+# Kinds the synthetic variations draw from; the rest of the count vector stays empty
+KINDS = [0, 9, 27, 31]
+
+
+def brute_force_distance(need, natural, counts):
+    """Fewest unfilled slots over every way of placing the hand's tiles and jokers.
+
+    Each kind's natural slots take only that kind's tiles; its group slots
+    take that kind's tiles or jokers.
+    """
+    choices = []
+    for kind in KINDS:
+        naturals, groups, have = natural[kind], need[kind] - natural[kind], counts[kind]
+        choices.append([
+            (filled_natural, filled_group, groups - filled_group)
+            for filled_natural in range(min(naturals, have) + 1)
+            for filled_group in range(min(groups, have - filled_natural) + 1)
+        ])
+    slots = sum(need)
+    best = slots
+    for placement in itertools.product(*choices):
+        filled = sum(n + g for n, g, _ in placement)
+        open_groups = sum(open_ for _, _, open_ in placement)
+        best = min(best, slots - filled - min(counts[JOKER_ID], open_groups))
+    return best
+
+
+def _random_case(rng):
+    need = [0] * NUM_TILE_KINDS
+    natural = [0] * NUM_TILE_KINDS
+    counts = [0] * NUM_TILE_KINDS
+    for kind in KINDS:
+        need[kind] = rng.randint(0, 4)
+        natural[kind] = rng.randint(0, need[kind])
+        counts[kind] = rng.randint(0, 4)
+    counts[JOKER_ID] = rng.randint(0, 8)
+    return need, natural, counts
+
+
+def test_joker_matching_agrees_with_brute_force():
+    rng = random.Random(30)
+    for _ in range(2000):
+        need, natural, counts = _random_case(rng)
+        distance = packed_distance(pack_counts(need), pack_counts(natural),
+                                   pack_counts(counts), counts[JOKER_ID])
+        assert distance == brute_force_distance(need, natural, counts), (need, natural, counts)
+
+
+def test_joker_assignment_fills_only_group_deficits():
+    rng = random.Random(31)
+    for _ in range(2000):
+        need, natural, counts = _random_case(rng)
+        assignment = joker_assignment(need, natural, counts)
+        group_missing = sum(max(0, need[k] - max(counts[k], natural[k])) for k in KINDS)
+        assert sum(assignment.values()) == min(counts[JOKER_ID], group_missing)
+
+
+def test_packed_deficit_matches_per_kind_sum():
+    rng = random.Random(32)
+    for _ in range(2000):
+        required = [rng.randint(0, 8) for _ in range(NUM_TILE_KINDS)]
+        have = [rng.randint(0, 8) for _ in range(NUM_TILE_KINDS)]
+        expected = sum(max(0, r - h) for r, h in zip(required, have))
+        assert packed_deficit(pack_counts(required), pack_counts(have)) == expected
+
+
+@pytest.mark.parametrize("jokers", [0, 1, 3])
+def test_analyze_counts_finds_every_variation(jokers):
+    table = build_variation_table()
+    for template_id in table.template_ids:
+        for index, (need, natural) in enumerate(table.records(template_id)):
+            counts = list(need)
+            # Swap group tiles for jokers; the hand stays complete
+            for kind in range(NUM_TILE_KINDS):
+                while counts[JOKER_ID] < jokers and counts[kind] > natural[kind] and kind != JOKER_ID:
+                    counts[kind] -= 1
+                    counts[JOKER_ID] += 1
+            analysis = analyze_counts(table, template_id, counts)
+            assert analysis.is_match
+            # The lowest matching index wins, which is this one unless a repeat precedes it
+            assert analysis.variation_index <= index
+
+
+class _RunTemplate(HandTemplate):
+    """A chow, a five- and a two-tile sequence, a pung and a single; jokers may only fill the pung."""
+
+    def __init__(self):
+        super().__init__(template_id="runs", name="Runs", description="Chow, sequences, pung, single",
+                         category="Test")
+
+    def generate_variations(self):
+        return [[
+            create_chow(NumberedTile(number=1, suit=Suit.BAMBOO), NumberedTile(number=2, suit=Suit.BAMBOO),
+                        NumberedTile(number=3, suit=Suit.BAMBOO)),
+            create_sequence(NumberedTile(number=1, suit=Suit.CHARACTER), 5),
+            create_sequence(NumberedTile(number=5, suit=Suit.DOT), 2),
+            create_pung(NumberedTile(number=9, suit=Suit.DOT)),
+            create_single(WindTile(WindDirection.NORTH)),
+        ]]
+
+
+def test_jokers_never_fill_runs():
+    variation = _RunTemplate().generate_variations()[0]
+    assert [is_natural_set(tile_set) for tile_set in variation] == [True, True, True, False, True]
+    table = build_variation_table([_RunTemplate()])
+    need, natural = table.record("runs", 0)
+    complete = list(need)
+    # Jokers for run tiles leave the hand short; jokers for the pung do not
+    for kind in (TILE_IDS["2B"], TILE_IDS["3C"]):
+        counts = list(complete)
+        counts[kind] -= 1
+        counts[JOKER_ID] += 1
+        assert analyze_counts(table, "runs", counts).distance == 1
+    counts = list(complete)
+    counts[TILE_IDS["9D"]] -= 2
+    counts[JOKER_ID] += 2
+    analysis = analyze_counts(table, "runs", counts)
+    assert analysis.is_match
+    assert analysis.jokers == {"9D": 2}
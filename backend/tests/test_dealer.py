@@ -0,0 +1,85 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from core.dealer import FULL_SET, Wall, deal, iter_deals
+from core.tiles import NUM_TILE_KINDS, TILE_COPIES, ids_to_counts
+
+
+def test_same_seed_same_deal():
+    assert deal(29) == deal(29)
+    assert Wall(29).tiles == Wall(29).tiles
+
+
+def test_seed_pins_the_deal():
+    # A fixed seed must deal the same hands on every Python release and platform
+    dealt = deal(2024)
+    assert dealt.short_names()[0] == [
+        "3C", "4C", "5C", "7C", "8C", "2D", "5D", "9D", "9D", "W", "RD", "WD", "FL", "JK",
+    ]
+    assert dealt.wall_remaining == 99
+
+
+def test_different_seeds_differ():
+    hands = {tuple(map(tuple, dealt.hands)) for dealt in iter_deals(0, 50)}
+    assert len(hands) == 50
+
+
+@pytest.mark.parametrize("players, hand_size, east_extra", [(4, 13, True), (3, 13, False), (8, 16, True)])
+def test_hands_come_from_the_wall(players, hand_size, east_extra):
+    for seed in range(20):
+        dealt = deal(seed, players=players, hand_size=hand_size, east_extra=east_extra)
+        sizes = [len(hand) for hand in dealt.hands]
+        assert sizes == [hand_size + (1 if east_extra and seat == 0 else 0) for seat in range(players)]
+        assert all(hand == sorted(hand) for hand in dealt.hands)
+        assert dealt.wall_remaining == len(FULL_SET) - sum(sizes)
+
+        # The hands are the first tiles drawn from the seed's wall, in seat order
+        wall = Wall(seed)
+        drawn = [wall.draw() for _ in range(sum(sizes))]
+        start = 0
+        for hand, size in zip(dealt.hands, sizes):
+            assert hand == sorted(drawn[start:start + size])
+            start += size
+
+
+def test_wall_holds_the_full_set():
+    wall = Wall(7)
+    assert ids_to_counts(wall.tiles) == TILE_COPIES
+    assert len(wall.tiles) == sum(TILE_COPIES) == 152
+    assert ids_to_counts(FULL_SET) == TILE_COPIES
+
+
+def test_draw_many_matches_single_draws():
+    one, many = Wall(11), Wall(11)
+    drawn = [one.draw() for _ in range(40)]
+    assert many.draw_many(25) + many.draw_many(15) == drawn
+    assert len(one) == len(many) == 112
+
+    many.draw_many(len(many))
+    with pytest.raises(IndexError):
+        many.draw()
+    with pytest.raises(IndexError):
+        many.draw_many(1)
+
+
+def test_deal_endpoints_match_deal():
+    client = TestClient(main.app)
+    assert client.get("/deals/5").json() == deal(5).to_dict()
+
+    response = client.get("/deals", params={"seed_start": 100, "count": 600, "players": 3})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == [dealt.to_dict() for dealt in iter_deals(100, 600, players=3)]
+
+    assert client.get("/deals/1", params={"players": 8, "hand_size": 20}).status_code == 400
+
+
+def test_every_kind_is_dealt():
+    seen = [0] * NUM_TILE_KINDS
+    for dealt in iter_deals(0, 20):
+        for kind in (kind for hand in dealt.hands for kind in hand):
+            seen[kind] += 1
+    assert all(seen)
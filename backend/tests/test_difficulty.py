@@ -0,0 +1,63 @@
+import itertools
+from math import comb, prod
+
+import pytest
+
+from core.analyzer import HAND_SIZE, pack_counts, packed_distance
+from core.difficulty import TOTAL_TILES, count_deals, get_difficulty_table, variation_signature
+from core.tiles import JOKER_ID, NUM_TILE_KINDS, TILE_COPIES
+from core.variation_table import build_variation_table
+
+# One entry per physical tile, as its kind
+WALL = [kind for kind in range(NUM_TILE_KINDS) for _ in range(TILE_COPIES[kind])]
+
+
+@pytest.fixture(scope="module")
+def table():
+    return build_variation_table()
+
+
+def _distinct_records(table):
+    """One (need, natural) per distinct signature."""
+    records = {}
+    for template_id in table.template_ids:
+        for need, natural in table.records(template_id):
+            records.setdefault(variation_signature(need, natural), (bytes(need), bytes(natural)))
+    return records
+
+
+def _distance(need, natural, counts):
+    return min(HAND_SIZE, packed_distance(pack_counts(need), pack_counts(natural),
+                                          pack_counts(counts), counts[JOKER_ID]))
+
+
+def test_two_tile_deals_match_enumeration(table):
+    # Every pair of physical tiles
+    for signature, (need, natural) in _distinct_records(table).items():
+        expected = [0] * (HAND_SIZE + 1)
+        for tiles in itertools.combinations(WALL, 2):
+            counts = [0] * NUM_TILE_KINDS
+            for kind in tiles:
+                counts[kind] += 1
+            expected[_distance(need, natural, counts)] += 1
+        assert count_deals(signature, 2) == expected
+
+
+def test_three_tile_deals_match_enumeration(table):
+    # Every multiset of kinds, weighted by the ways to pick its physical tiles
+    for signature, (need, natural) in _distinct_records(table).items():
+        expected = [0] * (HAND_SIZE + 1)
+        for kinds in itertools.combinations_with_replacement(range(NUM_TILE_KINDS), 3):
+            counts = [0] * NUM_TILE_KINDS
+            for kind in kinds:
+                counts[kind] += 1
+            ways = prod(comb(TILE_COPIES[kind], count) for kind, count in enumerate(counts) if count)
+            expected[_distance(need, natural, counts)] += ways
+        assert count_deals(signature, 3) == expected
+
+
+def test_distributions_cover_every_deal(table):
+    difficulty = get_difficulty_table(table, 13)
+    for template_id in table.template_ids:
+        for variation in difficulty.variations[template_id]:
+            assert sum(variation.distance_counts) == comb(TOTAL_TILES, 13)
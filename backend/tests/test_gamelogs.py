@@ -0,0 +1,84 @@
+import json
+import multiprocessing
+
+import pytest
+
+from core.dealer import deal
+from core.tiles import TILE_KINDS
+from core.variation_table import get_variation_table
+from gamelogs import GameAggregator, _game_id, ingest, to_columns
+
+
+def _write_log(path, games=6):
+    lines = []
+    for game in range(games):
+        hands = deal(game).hands
+        for seat, hand in enumerate(hands):
+            tiles = [TILE_KINDS[kind] for kind in hand]
+            lines.append({"game": f"g{game}", "seat": seat, "action": "deal", "tiles": tiles})
+        lines.append({"game": f"g{game}", "seat": 0, "action": "discard",
+                      "tiles": [TILE_KINDS[hands[0][0]]]})
+    # Events that must be rejected on their own, not abort the run
+    lines.append({"game": "g0", "seat": 1e400, "action": "draw", "tiles": ["1B"]})
+    lines.append({"game": "g1", "seat": 0, "action": "discard", "tiles": ["nope"]})
+    text = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+    # json.dumps writes 1e400 as Infinity; spell the overflowing literal out
+    path.write_text(text.replace("Infinity", "1e400"))
+    return len(lines) + 1
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_bad_events_are_counted_not_fatal(tmp_path, workers):
+    log = tmp_path / "games.jsonl"
+    total = _write_log(log)
+    stats, events, errors = ingest([str(log)], workers=workers, chunk_lines=7)
+    assert events == total
+    assert errors == 3
+    assert all(s.player_games == 6 * 4 for s in stats.values())
+
+
+def test_results_do_not_depend_on_worker_count(tmp_path):
+    log = tmp_path / "games.jsonl"
+    _write_log(log)
+    single = to_columns(ingest([str(log)], workers=1)[0])
+    parallel = to_columns(ingest([str(log)], workers=3, chunk_lines=5)[0])
+    assert single == parallel
+
+
+def test_game_id_is_extracted_without_parsing():
+    assert _game_id('{"game": "g1", "seat": 0}') == "g1"
+    assert _game_id('{"seat": 1, "game": 42}') == "42"
+    assert _game_id('{"seat": 1}') == ""
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                    reason="the patched method only reaches forked workers")
+def test_dead_worker_is_reported(tmp_path, monkeypatch):
+    import os
+    import gamelogs
+
+    log = tmp_path / "games.jsonl"
+    _write_log(log)
+    # Workers are forked, so they inherit the patched method
+    monkeypatch.setattr(gamelogs.GameAggregator, "process_line", lambda self, line: os._exit(3))
+    with pytest.raises(gamelogs.WorkerDied):
+        ingest([str(log)], workers=2)
+
+
+def test_rejected_events_change_nothing():
+    aggregator = GameAggregator(get_variation_table().template_ids)
+    aggregator.process_line(json.dumps({"game": "g", "seat": 0, "action": "deal",
+                                        "tiles": ["1B", "1B", "1B", "2B"]}))
+    player = aggregator.games["g"][0]
+    before = (list(player.counts), player.turn, list(player.best))
+    for event in [
+        {"action": "draw", "tiles": ["1B", "1B"]},           # A fifth and sixth 1B
+        {"action": "discard", "tiles": ["2B", "3B"]},        # 3B is not held
+        {"action": "shuffle", "tiles": ["2B"]},              # Unknown action
+    ]:
+        aggregator.process_line(json.dumps(dict(event, game="g", seat=0)))
+    assert aggregator.errors == 3
+    assert (list(player.counts), player.turn, list(player.best)) == before
+    # Nor does a rejected event open a seat or a game
+    aggregator.process_line(json.dumps({"game": "h", "seat": 1, "action": "discard", "tiles": ["1B"]}))
+    assert aggregator.errors == 4 and "h" not in aggregator.games
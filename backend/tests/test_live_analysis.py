@@ -0,0 +1,35 @@
+from fastapi.testclient import TestClient
+
+import main
+
+HAND = ["1B", "1B", "2B", "3B", "4B", "5B"] + ["1C"] * 4 + ["1D"] * 4
+
+
+def test_own_exposures_do_not_prune_the_hand():
+    # The hand's two kongs are exposed, so they are visible too, with a discarded joker
+    response = TestClient(main.app).post("/analyze/sequence_and_kongs/live", json={
+        "hand": HAND,
+        "visible": ["1C"] * 4 + ["1D"] * 4 + ["JK"],
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["is_match"]
+    assert body["details"]["distance"] == 0
+    assert body["details"]["closest_variation"] == HAND
+
+
+def test_other_visible_tiles_still_prune():
+    # Every 1C and every joker is visible and none is held, so no variation needing 1C is live
+    response = TestClient(main.app).post("/analyze/sequence_and_kongs/live", json={
+        "hand": ["1B", "1B", "2B", "3B", "4B", "5B"] + ["1D"] * 4,
+        "visible": ["1C"] * 4 + ["JK"] * 8,
+    })
+    details = response.json()["details"]
+    assert details["live_variations"] == details["total_variations"] - 3
+
+
+def test_visible_over_the_copies_is_rejected():
+    response = TestClient(main.app).post("/analyze/sequence_and_kongs/live", json={
+        "hand": HAND, "visible": ["1C"] * 5,
+    })
+    assert response.status_code == 400
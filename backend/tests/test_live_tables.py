@@ -0,0 +1,65 @@
+import json
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from core.analyzer import analyze_counts
+from core.pruning import live_indices, prune
+from core.tiles import JOKER_ID, NUM_TILE_KINDS, TILE_COPIES, ids_to_counts, parse_short_names
+from core.variation_table import get_variation_table
+from live_tables import GameTable, MoveError
+
+
+def _set_hand(game, seat, short_names):
+    game.hands[seat][:] = bytes(ids_to_counts(parse_short_names(short_names)))
+    game.exposed[seat][:] = bytes(NUM_TILE_KINDS)
+
+
+def test_called_discard_does_not_prune_the_callers_hand():
+    table = get_variation_table()
+    game = GameTable("t", 1, table)
+    # Every joker is already in the discard pile
+    game.pile[JOKER_ID] = 8
+    _set_hand(game, 0, ["1C", "2B", "3B", "4B", "5B", "6B", "7B", "8B", "9B", "N", "E", "S", "W", "FL"])
+    _set_hand(game, 1, ["1B", "1B", "2B", "3B", "4B", "5B", "1C", "1C", "1C", "1D", "1D", "1D", "1D"])
+
+    game.apply(0, {"action": "discard", "tiles": ["1C"]})
+    game.apply(1, {"action": "call", "tiles": ["1C", "1C", "1C", "1C"]})
+
+    counts = list(game.hands[1])
+    assert analyze_counts(table, "sequence_and_kongs", counts).distance == 0
+    assert game.distances[1][game.template_ids.index("sequence_and_kongs")] == 0
+    assert game.pile[parse_short_names(["1C"])[0]] == 0
+    game.apply(1, {"action": "mahjong"})
+    assert game.finished and game.winner == 1
+
+
+def test_pile_pruning_matches_the_live_view():
+    table = get_variation_table()
+    rng = random.Random(43)
+    for _ in range(200):
+        pile = [rng.randint(0, copies) if rng.random() < 0.3 else 0 for copies in TILE_COPIES]
+        live = prune(table, pile)
+        for template_id in table.template_ids:
+            assert live_indices(table, template_id, pile) == live.live(template_id)
+
+
+@pytest.mark.parametrize("tiles", [5, None, "1B", {"1B": 1}, ["1B", 2], [None]])
+def test_malformed_tiles_are_move_errors(tiles):
+    game = GameTable("t", 3, get_variation_table())
+    with pytest.raises(MoveError):
+        game.apply(0, {"action": "discard", "tiles": tiles})
+    assert game.seq == 0
+
+
+def test_malformed_move_is_reported_on_the_socket():
+    client = TestClient(main.app)
+    table_id = client.post("/tables", json={"seed": 4}).json()["table_id"]
+    with client.websocket_connect(f"/tables/{table_id}/ws?seat=0") as websocket:
+        websocket.receive_json()  # Snapshot
+        websocket.send_text(json.dumps({"action": "discard", "tiles": 5}))
+        assert websocket.receive_json() == {"error": "Tiles must be a list of short names"}
+        websocket.send_text(json.dumps({"action": "discard", "tiles": None}))
+        assert "error" in websocket.receive_json()
@@ -0,0 +1,36 @@
+from core.difficulty import get_difficulty_table
+from core.pruning import get_dependency_index
+from core.search import get_search_index
+from core.variation_pool import get_variation_pool
+from core.variation_table import build_variation_table, estimate_size
+
+
+def test_indexes_are_reported_and_outside_the_budget():
+    table = build_variation_table()
+    table.memory_budget = 1
+    pool = get_variation_pool(table)
+    get_dependency_index(table)
+    get_search_index(table)
+    get_difficulty_table(table, 13)
+    for template_id in table.template_ids:
+        table.packed_records(template_id)
+
+    report = table.memory_report()
+    assert set(report["indexes"]) == {"variation_pool", "dependency_index",
+                                      "search_index", "difficulty_13"}
+    assert all(size > 0 for size in report["indexes"].values())
+    assert report["index_bytes"] == sum(report["indexes"].values())
+    # The budget evicts template lookups, never the indexes
+    assert report["evictions"] > 0
+    assert get_variation_pool(table) is pool
+
+
+def test_estimate_size_does_not_count_the_table():
+    class Index:
+        def __init__(self, table):
+            self.table = table
+            self.view = table.record(table.template_ids[0], 0)
+
+    table = build_variation_table()
+    # Only the object and its attribute dict; the table and its buffer are not owned
+    assert estimate_size(Index(table)) < 1024 < table.nbytes
@@ -0,0 +1,94 @@
+import random
+import sqlite3
+import time
+
+import pytest
+
+from core.analyzer import HAND_SIZE, analyze_counts, joker_assignment, pack_counts, packed_distance
+from core.dealer import deal
+from core.result_cache import AnalysisCache, SharedStore, analyze_cached
+from core.tiles import JOKER_ID, NUM_TILE_KINDS, SUIT_PERMUTATIONS, TILE_KINDS, permute_counts
+from core.variation_table import build_variation_table, record_short_names
+
+
+@pytest.fixture(scope="module")
+def table():
+    return build_variation_table()
+
+
+def _hands(table):
+    """Random deals, hands one or two tiles off a variation, and every suit relabelling of them."""
+    rng = random.Random(30)
+    hands = [deal(seed).hands[1] for seed in range(40)]
+    hands = [[hand.count(kind) for kind in range(NUM_TILE_KINDS)] for hand in hands]
+    for template_id in table.template_ids:
+        for need, _natural in table.records(template_id):
+            counts = list(need)
+            for _ in range(rng.randint(1, 2)):
+                kind = rng.choice([k for k in range(NUM_TILE_KINDS) if counts[k]])
+                counts[kind] -= 1
+                counts[rng.choice([JOKER_ID, rng.randrange(JOKER_ID)])] += 1
+            hands.append(counts)
+    return [permute_counts(counts, mapping) for counts in hands[::3] for mapping in SUIT_PERMUTATIONS]
+
+
+def _assert_equivalent(table, cached, direct, counts):
+    # Suit-equivalent hands share one entry, so a tie may resolve to another
+    # closest variation; the distance and the variation's fit must agree
+    assert cached.template_id == direct.template_id
+    assert cached.distance == direct.distance
+    need, natural = table.record(cached.template_id, cached.variation_index)
+    assert cached.variation == record_short_names(need)
+    assert packed_distance(pack_counts(need), pack_counts(natural), pack_counts(counts),
+                           counts[JOKER_ID]) + max(0, sum(counts) - HAND_SIZE) == direct.distance
+    # Jokers short of the group deficit may be spread over other, equally valid kinds
+    group_missing = {TILE_KINDS[kind]: max(0, need[kind] - max(counts[kind], natural[kind]))
+                     for kind in range(NUM_TILE_KINDS)}
+    assert all(used <= group_missing[name] for name, used in cached.jokers.items())
+    assert sum(cached.jokers.values()) == sum(joker_assignment(need, natural, counts).values())
+
+
+def test_cached_analyses_match_direct_ones(table):
+    cache = AnalysisCache(maxsize=100000)
+    for _ in range(2):  # Cold, then warm
+        for counts in _hands(table):
+            for template_id in table.template_ids:
+                _assert_equivalent(table, analyze_cached(table, template_id, counts, cache),
+                                   analyze_counts(table, template_id, counts), counts)
+    assert cache.hits > 0
+
+
+def test_shared_tier_serves_other_workers(table, tmp_path):
+    path = str(tmp_path / "analyses.sqlite")
+    writer = AnalysisCache(maxsize=100000, shared=SharedStore(path))
+    reader = AnalysisCache(maxsize=100000, shared=SharedStore(path))
+    hands = _hands(table)[:60]
+    for counts in hands:
+        for template_id in table.template_ids:
+            analyze_cached(table, template_id, counts, writer)
+    for counts in hands:
+        for template_id in table.template_ids:
+            _assert_equivalent(table, analyze_cached(table, template_id, counts, reader),
+                               analyze_counts(table, template_id, counts), counts)
+    assert reader.shared_hits > 0
+
+
+def test_locked_shared_tier_is_skipped(table, tmp_path):
+    path = str(tmp_path / "analyses.sqlite")
+    cache = AnalysisCache(maxsize=100000, shared=SharedStore(path))
+    blocker = sqlite3.connect(path)
+    blocker.execute("BEGIN EXCLUSIVE")
+    try:
+        counts = _hands(table)[0]
+        started = time.monotonic()
+        for template_id in table.template_ids:
+            _assert_equivalent(table, analyze_cached(table, template_id, counts, cache),
+                               analyze_counts(table, template_id, counts), counts)
+        assert time.monotonic() - started < 1.0
+        stats = cache.stats()
+        # Readers get past the writer's lock in WAL mode; every write was skipped
+        assert stats["shared_errors"] == len(table.template_ids)
+        assert stats["misses"] == len(table.template_ids)
+    finally:
+        blocker.rollback()
+        blocker.close()
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from core.search import SearchQuery, TileGroup, VariationSearchIndex
+from core.tiles import NUM_TILE_KINDS, TILE_IDS
+from core.variation_table import build_variation_table, record_short_names
+
+
+@pytest.fixture(scope="module")
+def table():
+    return build_variation_table()
+
+
+@pytest.fixture(scope="module")
+def index(table):
+    return VariationSearchIndex(table)
+
+
+def _brute_force(table, query):
+    """(overlap, template id, variation index) of every match, scanning every record."""
+    wanted = [query.tiles.count(kind) for kind in range(NUM_TILE_KINDS)]
+    matches = []
+    for template_id in table.template_ids:
+        for index, (need, _natural) in enumerate(table.records(template_id)):
+            if not all(any(need[kind] >= group.min_count for kind in group.tiles)
+                       for group in query.groups):
+                continue
+            overlap = sum(min(count, need[kind]) for kind, count in enumerate(wanted))
+            if query.min_overlap > 0 and overlap < query.min_overlap:
+                continue
+            matches.append((overlap, template_id, index))
+    return matches
+
+
+def _ids(*names):
+    return [TILE_IDS[name] for name in names]
+
+
+def _check(table, index, query):
+    result = index.search(query)
+    expected = _brute_force(table, query)
+    assert result.total == len(expected)
+
+    counts = {}
+    for _overlap, template_id, _index in expected:
+        counts[template_id] = counts.get(template_id, 0) + 1
+    assert result.template_matches == counts
+
+    # Ranked by overlap, ties in table order
+    slots = {slot: position for position, slot in enumerate(index.slots)}
+    expected.sort(key=lambda match: (-match[0], slots[match[1:]]))
+    assert [(hit.overlap, hit.template_id, hit.variation_index) for hit in result.hits] == \
+        expected[:query.limit]
+    for hit in result.hits:
+        assert hit.variation == record_short_names(table.record(hit.template_id, hit.variation_index)[0])
+    return result
+
+
+def test_docstring_queries(table, index):
+    result = _check(table, index, SearchQuery(tiles=_ids("1B", "2B", "3B", "4B"), min_overlap=3))
+    assert result.total and all(hit.overlap >= 3 for hit in result.hits)
+
+    result = _check(table, index, SearchQuery(groups=[
+        TileGroup(tiles=_ids("5B", "5C", "5D"), min_count=4),
+        TileGroup(tiles=_ids("FL"), min_count=1),
+    ]))
+    assert result.total
+
+
+def test_empty_query_matches_everything(table, index):
+    result = _check(table, index, SearchQuery(limit=5))
+    assert result.total == len(index.slots)
+    assert len(result.hits) == 5
+
+
+def test_impossible_query_matches_nothing(table, index):
+    result = _check(table, index, SearchQuery(groups=[TileGroup(tiles=_ids("1B"), min_count=9)]))
+    assert result.total == 0 and result.hits == [] and result.template_matches == {}
+
+
+def test_random_queries_match_brute_force(table, index):
+    rng = random.Random(34)
+    for _ in range(40):
+        tiles = [rng.randrange(NUM_TILE_KINDS) for _ in range(rng.randint(0, 8))]
+        groups = [
+            TileGroup(tiles=rng.sample(range(NUM_TILE_KINDS), rng.randint(1, 3)),
+                      min_count=rng.randint(1, 4))
+            for _ in range(rng.randint(0, 2))
+        ]
+        query = SearchQuery(tiles=tiles, min_overlap=rng.randint(0, 4), groups=groups,
+                            limit=rng.choice([1, 10, 1000]))
+        _check(table, index, query)
@@ -0,0 +1,63 @@
+import pytest
+
+from core.tiles import (
+    JOKER_ID, TILE_COPIES, TILE_IDS, TILE_KINDS, DragonTile, TileParseError,
+    create_tile_from_short_name, ids_to_counts, parse_short_names,
+)
+
+
+def test_short_names_are_case_insensitive():
+    names = ["1b", "9C", "n", "Wd", "fl", "jK"]
+    assert parse_short_names(names) == parse_short_names([name.upper() for name in names])
+    assert parse_short_names(names) == [TILE_IDS[name.upper()] for name in names]
+
+
+@pytest.mark.parametrize("short_name, dragon, suit", [
+    ("RD", "RD", "C"), ("RB", "RD", "B"), ("RDB", "RD", "B"), ("rdb", "RD", "B"),
+    ("GC", "GD", "C"), ("GDD", "GD", "D"), ("WB", "WD", "B"), ("wdc", "WD", "C"),
+])
+def test_suited_dragons_keep_their_kind(short_name, dragon, suit):
+    assert parse_short_names([short_name]) == [TILE_IDS[dragon]]
+    tile = create_tile_from_short_name(short_name)
+    assert isinstance(tile, DragonTile)
+    assert tile.dragon_type.value == dragon
+    assert tile.suit.value == suit
+
+
+@pytest.mark.parametrize("names, position", [
+    (["XX"], 0),
+    (["1B", "2B", "0B"], 2),
+    (["1B", "RDX"], 1),
+    (["1B", "2B", "3B", None], 3),
+    (["1B", 5], 1),
+])
+def test_parse_error_reports_the_first_bad_position(names, position):
+    with pytest.raises(TileParseError) as excinfo:
+        parse_short_names(names)
+    assert excinfo.value.position == position
+    assert excinfo.value.short_name == names[position]
+    assert f"position {position}" in str(excinfo.value)
+
+
+@pytest.mark.parametrize("name, dragon_spellings", [
+    ("1B", None),
+    ("RD", ["RD", "RB", "RDC", "rdd"]),
+    ("JK", None),
+])
+def test_copy_limit_per_kind(name, dragon_spellings):
+    kind = TILE_IDS[name]
+    copies = TILE_COPIES[kind]
+    spellings = dragon_spellings or [name]
+    names = [spellings[i % len(spellings)] for i in range(copies)]
+    assert ids_to_counts(parse_short_names(names))[kind] == copies
+
+    with pytest.raises(TileParseError) as excinfo:
+        parse_short_names(names + [spellings[0]])
+    assert excinfo.value.position == copies
+    assert f"More than {copies} copies" in str(excinfo.value)
+
+
+def test_set_sizes():
+    assert TILE_COPIES[JOKER_ID] == 8
+    assert sum(TILE_COPIES) == 152
+    assert len(TILE_KINDS) == len(set(TILE_KINDS))
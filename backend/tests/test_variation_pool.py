@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from core.analyzer import analyze_counts
+from core.dealer import deal
+from core.tiles import JOKER_ID, NUM_TILE_KINDS
+from core.variation_pool import VariationPool
+from core.variation_table import build_variation_table
+
+
+@pytest.fixture(scope="module")
+def table():
+    return build_variation_table()
+
+
+@pytest.fixture(scope="module")
+def pool(table):
+    return VariationPool(table)
+
+
+def _near_hands(table, rng, count):
+    """Hands close to a variation: some tiles swapped out and some swapped for jokers."""
+    records = [record for template_id in table.template_ids for record in table.records(template_id)]
+    for _ in range(count):
+        need, natural = rng.choice(records)
+        counts = list(need)
+        for _ in range(rng.randint(0, 3)):
+            kind = rng.choice([k for k in range(NUM_TILE_KINDS) if counts[k]])
+            counts[kind] -= 1
+            if rng.random() < 0.5 and counts[JOKER_ID] < 8:
+                counts[JOKER_ID] += 1
+            else:
+                counts[rng.randrange(JOKER_ID)] += 1
+        yield counts
+
+
+def test_stats_separate_repeats_from_sharing(pool, table):
+    stats = pool.stats()
+    assert stats["variations"] == len(table)
+    assert stats["distinct_variations"] == len(pool)
+    assert (stats["variations"] - stats["distinct_variations"]
+            == stats["duplicates_within_templates"] + stats["cross_template_references"])
+
+
+def test_shared_by_lists_identical_variations(pool, table):
+    for template_id in table.template_ids:
+        for index, (need, natural) in enumerate(table.records(template_id)):
+            uses = pool.shared_by(template_id, index)
+            assert index in uses[template_id]
+            for other_id, indices in uses.items():
+                for other_index in indices:
+                    other_need, other_natural = table.record(other_id, other_index)
+                    assert (bytes(other_need), bytes(other_natural)) == (bytes(need), bytes(natural))
+
+
+def test_analyze_all_matches_analyze_counts(pool, table):
+    rng = random.Random(45)
+    hands = [deal(seed).hands[1] for seed in range(200)]
+    hands = [[hand.count(kind) for kind in range(NUM_TILE_KINDS)] for hand in hands]
+    hands += list(_near_hands(table, rng, 300))
+    for counts in hands:
+        analyses = pool.analyze_all(counts)
+        for template_id in table.template_ids:
+            assert analyses[template_id] == analyze_counts(table, template_id, counts)
+
+
+def test_analyze_all_leaves_budgeted_lookups_alone():
+    table = build_variation_table()
+    table.memory_budget = 1
+    pool = VariationPool(table)
+    counts = [0] * NUM_TILE_KINDS
+    for kind in deal(1).hands[1]:
+        counts[kind] += 1
+    for _ in range(10):
+        pool.analyze_all(counts)
+    assert (table.lookup_builds, table.lookup_evictions) == (0, 0)
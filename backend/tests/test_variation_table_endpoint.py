@@ -0,0 +1,110 @@
+import base64
+import json
+import os
+import random
+import shutil
+import subprocess
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from core.analyzer import analyze_counts
+from core.dealer import deal
+from core.tiles import (
+    _SHORT_NAME_TABLE, TILE_COPIES, TILE_IDS, TILE_KINDS, ids_to_counts, parse_short_names,
+)
+from core.variation_table import record_short_names
+from main import _accepts_gzip
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("br;q=1.0, gzip;q=0.5", True),
+    ("*", True),
+    ("", False),
+    ("identity", False),
+    ("gzip;q=0", False),
+    ("gzip; q=0.0, identity", False),
+    ("*;q=0", False),
+    ("*, gzip;q=0", False),
+    ("gzip;q=0.1, *;q=0", True),
+])
+def test_accepts_gzip(header, expected):
+    assert _accepts_gzip(header) is expected
+
+
+def test_encodings_have_distinct_etags():
+    client = TestClient(main.app)
+    table = main.get_variation_table()
+    identity = client.get("/api/variation-table", headers={"Accept-Encoding": "gzip;q=0"})
+    gzipped = client.get("/api/variation-table", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in identity.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert identity.content == gzipped.content == table.to_bytes()
+    assert identity.headers["etag"] != gzipped.headers["etag"]
+
+    # A cached copy only validates the encoding it was served in
+    revalidated = client.get("/api/variation-table", headers={
+        "Accept-Encoding": "gzip", "If-None-Match": gzipped.headers["etag"]})
+    assert revalidated.status_code == 304
+    mismatched = client.get("/api/variation-table", headers={
+        "Accept-Encoding": "identity", "If-None-Match": gzipped.headers["etag"]})
+    assert mismatched.status_code == 200
+
+
+JS_DECODER = os.path.join(os.path.dirname(BACKEND), "shared", "js", "variation-table.js")
+
+# Decodes the table with the client decoder and analyzes every hand from stdin
+JS_SCRIPT = """
+const VariationTable = require(process.argv[1]);
+const input = JSON.parse(require('fs').readFileSync(0, 'utf-8'));
+const bytes = Buffer.from(input.table, 'base64');
+const table = VariationTable.decode(bytes.buffer.slice(bytes.byteOffset, bytes.byteOffset + bytes.length));
+const results = input.hands.map(names => {
+    const counts = VariationTable.countTiles(names);
+    return table.templateIds().map(id => {
+        const { distance, variationIndex } = table.analyze(id, counts);
+        return [id, distance, variationIndex];
+    });
+});
+process.stdout.write(JSON.stringify(results));
+"""
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_js_decoder_matches_backend_analyses():
+    table = main.get_variation_table()
+    rng = random.Random(41)
+    hands = [[TILE_KINDS[kind] for kind in deal(seed).hands[seed % 4]] for seed in range(100)]
+    for template_id in table.template_ids:
+        for need, _natural in table.records(template_id):
+            names = record_short_names(need)
+            for _ in range(rng.randint(0, 2)):
+                names[rng.randrange(len(names))] = rng.choice(["JK", rng.choice(TILE_KINDS)])
+            hands.append(names)
+    # Random replacements may exceed a tile's copies
+    hands = [names for names in hands
+             if all(names.count(name) <= TILE_COPIES[TILE_IDS[name]] for name in names)]
+
+    payload = json.dumps({"table": base64.b64encode(table.to_bytes()).decode("ascii"),
+                          "hands": hands})
+    output = subprocess.run(["node", "-e", JS_SCRIPT, JS_DECODER], input=payload,
+                            capture_output=True, text=True, check=True).stdout
+    for names, results in zip(hands, json.loads(output)):
+        counts = ids_to_counts(parse_short_names(names))
+        for template_id, distance, variation_index in results:
+            analysis = analyze_counts(table, template_id, counts)
+            assert (distance, variation_index) == (analysis.distance, analysis.variation_index)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_js_short_names_match_backend():
+    script = ("const VariationTable = require(process.argv[1]);"
+              "process.stdout.write(JSON.stringify(VariationTable.shortNames()));")
+    output = subprocess.run(["node", "-e", script, JS_DECODER],
+                            capture_output=True, text=True, check=True).stdout
+    assert json.loads(output) == {name: kind for name, (kind, _factory) in _SHORT_NAME_TABLE.items()}
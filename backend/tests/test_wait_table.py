@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from core import wait_table
+from core.dealer import deal
+from core.tiles import JOKER_ID, NUM_TILE_KINDS, TILE_IDS
+from core.variation_table import build_variation_table
+from core.wait_table import (
+    FORMAT_VERSION, WAIT_TABLE_PATH_ENV, WaitTable, build_wait_table_bytes, get_wait_table,
+    open_wait_table, scan_waits, write_wait_table,
+)
+
+
+@pytest.fixture(scope="module")
+def table():
+    return build_variation_table()
+
+
+def _natural_hands(table):
+    """13-tile hands without jokers: one tile off a variation, two off, and random deals."""
+    rng = random.Random(39)
+    hands = []
+    for template_id in table.template_ids:
+        for need, _natural in table.records(template_id):
+            counts = list(need)
+            if counts[JOKER_ID]:
+                continue
+            kind = rng.choice([k for k in range(NUM_TILE_KINDS) if counts[k]])
+            counts[kind] -= 1
+            hands.append(list(counts))
+            # Swap another tile for a random one
+            other = rng.choice([k for k in range(NUM_TILE_KINDS) if counts[k]])
+            counts[other] -= 1
+            counts[rng.randrange(JOKER_ID)] += 1
+            if max(counts) <= 4:
+                hands.append(counts)
+    for seed in range(50):
+        tiles = [kind for kind in deal(seed).hands[1] if kind != JOKER_ID][:13]
+        if len(tiles) == 13:
+            hands.append([tiles.count(kind) for kind in range(NUM_TILE_KINDS)])
+    return hands
+
+
+def test_file_round_trip_matches_build_and_scan(table, tmp_path):
+    path = str(tmp_path / "waits.bin")
+    size = write_wait_table(path, table)
+    built = WaitTable(build_wait_table_bytes(table), source="memory")
+    mapped = open_wait_table(path)
+    assert mapped.nbytes == size == built.nbytes
+    assert mapped.table_version == table.version
+    assert mapped.memory_report()["mapped"]
+    hands = _natural_hands(table)
+    assert any(built.lookup(counts) for counts in hands)
+    for counts in hands:
+        waits = mapped.lookup(counts)
+        assert waits == built.lookup(counts)
+        assert waits == scan_waits(table, counts)
+
+
+def _joker_hands(table):
+    """13-tile hands holding jokers: variations with tiles swapped for jokers, then one tile off."""
+    rng = random.Random(3939)
+    hands = []
+    for template_id in table.template_ids:
+        for need, _natural in table.records(template_id):
+            counts = list(need)
+            for _ in range(rng.randint(1, 3)):
+                kind = rng.choice([k for k in range(JOKER_ID) if counts[k]])
+                counts[kind] -= 1
+                counts[JOKER_ID] += 1
+            kind = rng.choice([k for k in range(NUM_TILE_KINDS) if counts[k]])
+            counts[kind] -= 1
+            hands.append(counts)
+    for seed in range(50):
+        tiles = deal(seed).hands[1][:13]
+        if JOKER_ID in tiles:
+            hands.append([tiles.count(kind) for kind in range(NUM_TILE_KINDS)])
+    return hands
+
+
+def test_joker_hands_match_scan(table):
+    built = WaitTable(build_wait_table_bytes(table), source="memory")
+    hands = _joker_hands(table)
+    assert any(JOKER_ID in [TILE_IDS[t] for wait in built.lookup(c).values() for t in wait]
+               for c in hands)
+    for counts in hands:
+        assert built.lookup(counts) == scan_waits(table, counts)
+
+
+def test_stale_file_is_rebuilt(table, tmp_path, monkeypatch):
+    path = tmp_path / "waits.bin"
+    write_wait_table(str(path), table)
+    data = bytearray(path.read_bytes())
+    # Rewrite the format version as the previous one
+    data[4:6] = (FORMAT_VERSION - 1).to_bytes(2, "little")
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        open_wait_table(str(path))
+
+    monkeypatch.setenv(WAIT_TABLE_PATH_ENV, str(path))
+    monkeypatch.setattr(wait_table, "_wait_table", None)
+    monkeypatch.setattr(wait_table, "get_variation_table", lambda: table)
+    assert get_wait_table().nbytes == len(build_wait_table_bytes(table))
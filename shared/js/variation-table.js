@@ -0,0 +1,191 @@
+// Client-side decoder for the backend's compiled variation table
+//
+// Download the table once from GET /api/variation-table (the browser undoes
+// the gzip transfer encoding) and match hands locally:
+//
+//     const table = await VariationTable.fetch('http://localhost:8000');
+//     const counts = VariationTable.countTiles(['1B', '1B', 'JK', ...]);
+//     table.analyze('sequence_and_kongs', counts);  // { distance, variationIndex, tiles }
+//
+// Layout (little-endian): magic "MJVT", format version (u16), tile kinds (u16),
+// template count (u32), data offset (u32); per template its id length (u16),
+// id (utf-8), first record (u32) and record count (u32); then per variation
+// need[kinds] + natural[kinds] as unsigned bytes. Natural counts are tiles in
+// singles, pairs and runs, which jokers may not fill.
+
+const VariationTable = {
+    FORMAT_VERSION: 1,
+    HAND_SIZE: 14,
+
+    // Compact tile ids, in the backend's order (core/tiles.py TILE_KINDS)
+    TILE_KINDS: [
+        '1B', '2B', '3B', '4B', '5B', '6B', '7B', '8B', '9B',
+        '1C', '2C', '3C', '4C', '5C', '6C', '7C', '8C', '9C',
+        '1D', '2D', '3D', '4D', '5D', '6D', '7D', '8D', '9D',
+        'N', 'E', 'S', 'W', 'RD', 'GD', 'WD', 'FL', 'JK'
+    ],
+
+    // Decode a table from an ArrayBuffer
+    decode: function(buffer) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(
+            view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+        if (magic !== 'MJVT') {
+            throw new Error('Not a compiled variation table');
+        }
+        const version = view.getUint16(4, true);
+        if (version !== this.FORMAT_VERSION) {
+            throw new Error(`Unsupported variation table version: ${version}`);
+        }
+        const kinds = view.getUint16(6, true);
+        if (kinds !== this.TILE_KINDS.length) {
+            throw new Error(`Variation table was built for ${kinds} tile kinds`);
+        }
+        const templateCount = view.getUint32(8, true);
+        const dataOffset = view.getUint32(12, true);
+
+        const decoder = new TextDecoder('utf-8');
+        const templates = {};
+        let offset = 16;
+        for (let i = 0; i < templateCount; i++) {
+            const idLength = view.getUint16(offset, true);
+            offset += 2;
+            const id = decoder.decode(new Uint8Array(buffer, offset, idLength));
+            offset += idLength;
+            templates[id] = {
+                first: view.getUint32(offset, true),
+                count: view.getUint32(offset + 4, true)
+            };
+            offset += 8;
+        }
+
+        return new DecodedVariationTable(new Uint8Array(buffer, dataOffset), kinds, templates);
+    },
+
+    // Download and decode the table served by the backend
+    fetch: async function(baseUrl) {
+        const response = await fetch(`${baseUrl}/api/variation-table`);
+        if (!response.ok) {
+            throw new Error(`Failed to load variation table: ${response.status}`);
+        }
+        const table = this.decode(await response.arrayBuffer());
+        table.version = response.headers.get('X-Table-Version');
+        return table;
+    },
+
+    // Copies of each tile kind in the set: 8 flowers and 8 jokers, 4 of the rest
+    tileCopies: function(kind) {
+        const name = this.TILE_KINDS[kind];
+        return name === 'FL' || name === 'JK' ? 8 : 4;
+    },
+
+    // Every accepted (upper-case) spelling and its tile id, as in the
+    // backend's short-name table: dragons may carry a suit, either as
+    // 'RDB' or in the short form 'RB' produced by the backend's DragonTile
+    shortNames: function() {
+        if (!this._shortNames) {
+            const names = {};
+            this.TILE_KINDS.forEach((name, kind) => { names[name] = kind; });
+            for (const dragon of ['RD', 'GD', 'WD']) {
+                for (const suit of ['B', 'C', 'D']) {
+                    names[dragon + suit] = names[dragon];
+                    names[dragon[0] + suit] = names[dragon];
+                }
+            }
+            this._shortNames = names;
+        }
+        return this._shortNames;
+    },
+
+    // Turn a list of short names into a count vector over the tile ids
+    countTiles: function(shortNames) {
+        const names = this.shortNames();
+        const counts = new Array(this.TILE_KINDS.length).fill(0);
+        shortNames.forEach((name, position) => {
+            const kind = typeof name === 'string' ? names[name.toUpperCase()] : undefined;
+            if (kind === undefined) {
+                throw new Error(`Unknown tile short name at position ${position}: ${name}`);
+            }
+            counts[kind]++;
+            if (counts[kind] > this.tileCopies(kind)) {
+                throw new Error(
+                    `More than ${this.tileCopies(kind)} copies of tile at position ${position}: ${name}`);
+            }
+        });
+        return counts;
+    }
+};
+
+function DecodedVariationTable(data, kinds, templates) {
+    this.data = data;
+    this.kinds = kinds;
+    this.templates = templates;
+    this.version = null;
+}
+
+DecodedVariationTable.prototype = {
+    templateIds: function() {
+        return Object.keys(this.templates);
+    },
+
+    variationCount: function(templateId) {
+        return this.templates[templateId].count;
+    },
+
+    // Need and natural count vectors of one variation
+    record: function(templateId, index) {
+        const template = this.templates[templateId];
+        const start = (template.first + index) * 2 * this.kinds;
+        return {
+            need: this.data.subarray(start, start + this.kinds),
+            natural: this.data.subarray(start + this.kinds, start + 2 * this.kinds)
+        };
+    },
+
+    // Tiles a hand is missing from one variation, after using its jokers
+    distance: function(templateId, index, counts) {
+        const { need, natural } = this.record(templateId, index);
+        const joker = VariationTable.TILE_KINDS.length - 1;
+        let naturalMissing = 0;
+        let groupMissing = 0;
+        for (let kind = 0; kind < this.kinds; kind++) {
+            const missing = Math.max(0, need[kind] - counts[kind]);
+            const missingNatural = Math.max(0, natural[kind] - counts[kind]);
+            naturalMissing += missingNatural;
+            groupMissing += missing - missingNatural;
+        }
+        return naturalMissing + Math.max(0, groupMissing - counts[joker]);
+    },
+
+    // Closest variation of a template to a hand
+    analyze: function(templateId, counts) {
+        const template = this.templates[templateId];
+        if (!template) {
+            throw new Error(`Unknown template: ${templateId}`);
+        }
+        let best = { distance: VariationTable.HAND_SIZE, variationIndex: null, tiles: [] };
+        for (let index = 0; index < template.count; index++) {
+            const distance = this.distance(templateId, index, counts);
+            if (best.variationIndex === null || distance < best.distance) {
+                best = { distance, variationIndex: index, tiles: null };
+                if (distance === 0) break;
+            }
+        }
+        if (best.variationIndex !== null) {
+            const { need } = this.record(templateId, best.variationIndex);
+            best.tiles = [];
+            need.forEach((count, kind) => {
+                for (let i = 0; i < count; i++) best.tiles.push(VariationTable.TILE_KINDS[kind]);
+            });
+            // A hand with extra tiles is not complete, even if it covers a variation
+            const total = counts.reduce((sum, count) => sum + count, 0);
+            best.distance += Math.max(0, total - VariationTable.HAND_SIZE);
+        }
+        return best;
+    }
+};
+
+// Export for use in browser
+if (typeof module !== 'undefined' && module.exports) {
+    module.exports = VariationTable;
+}